@@ -0,0 +1,77 @@
+"""
+File d’attente à l’ouverture des inscriptions.
+
+À l’ouverture de la fenêtre, toutes les sessions arrivent dans la même minute.
+Chaque session reçoit un ticket (ordre d’arrivée) et n’accède aux formulaires
+qu’une fois admise. Les admissions sont limitées par un seau à jetons : `rate`
+sessions par seconde, avec une réserve de `burst` admissions immédiates.
+
+La file est gardée en mémoire du processus Streamlit (partagée entre les sessions
+via st.cache_resource). Une session admise le reste jusqu’à la fin de sa session.
+"""
+
+
+import threading
+import time
+
+
+class AdmissionQueue:
+    """
+        File d’attente à débit contrôlé (seau à jetons).
+
+        Args:
+            rate (float): Sessions admises par seconde.
+            burst (int): Nombre maximum d’admissions accumulées (pic autorisé).
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+
+        self._lock = threading.Lock()
+        self._next_ticket = 0  # prochain ticket distribué
+        self._admitted = 0  # tickets < _admitted sont admis
+        self._tokens = float(burst)
+        self._updated_at = time.monotonic()
+
+    def join(self) -> int:
+        """
+            Place une nouvelle session en fin de file.
+
+            Returns:
+                int: Ticket de la session.
+        """
+
+        with self._lock:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            return ticket
+
+    def position(self, ticket: int) -> int:
+        """
+            Nombre de sessions encore devant (ou égal à) ce ticket.
+
+            Returns:
+                int: 0 si la session est admise, sinon sa place dans la file (1 = la prochaine).
+        """
+
+        with self._lock:
+            self._admit()
+            return max(ticket - self._admitted + 1, 0)
+
+    def wait_time(self, position: int) -> float:
+        """
+            Estimation du temps d’attente (en secondes) pour une place dans la file.
+        """
+
+        return position / self.rate
+
+    def _admit(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+        waiting = self._next_ticket - self._admitted
+        admitted = min(int(self._tokens), waiting)
+        self._admitted += admitted
+        self._tokens -= admitted
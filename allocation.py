@@ -0,0 +1,385 @@
+"""
+Mode préférences : répartition des élèves à la fermeture des inscriptions.
+
+Au lieu de s’inscrire au premier arrivé, chaque élève classe quelques activités
+(table `preferences`, fonction `save_preferences`). À la fermeture, un professeur
+lance la répartition :
+- 1re passe : chaque élève reçoit au plus une activité parmi ses choix ; le nombre
+  d’élèves servis est maximal, puis la somme des coûts de rang est minimale
+  (flot de coût minimum, coût (rang + 1)² : mieux vaut deux deuxièmes choix
+  qu’un premier et un quatrième),
+- 2e passe : les élèves placés en P9 (ou P10) reçoivent, si possible, une activité
+  de l’autre période parmi leurs choix restants.
+
+Les places restantes tiennent compte des inscriptions déjà présentes (places
+partagées D2_D3 comprises) et un élève n’est jamais placé sur une période déjà
+occupée (P910 bloque P9 et P10). Le résultat est écrit en une seule requête
+(fonction `reserve_batch`) : la base revérifie places et périodes sous verrou, une
+inscription faite entre-temps (ou un second enregistrement) n’est pas doublée.
+"""
+
+
+import heapq
+from dataclasses import dataclass, field
+
+from supabase import Client
+
+from catalogue import Activity, Catalogue
+from registrations import RESERVED, RegistrationSnapshot
+
+MAX_PREFERENCES = 5  # choix classés par élève
+
+_INFINITY = float("inf")
+
+
+@dataclass(frozen=True)
+class Preference:
+    """
+        Choix classés d’un élève.
+
+        Attributes:
+            email (str): Adresse email de l’élève (minuscules).
+            name (str): Nom affiché de l’élève.
+            degree (int): Degré de l’élève.
+            activities (tuple[Activity, ...]): Activités, de la préférée à la moins préférée.
+    """
+
+    email: str
+    name: str
+    degree: int
+    activities: tuple
+
+
+@dataclass
+class Allocation:
+    """
+        Résultat d’une répartition.
+
+        Attributes:
+            assigned (dict[str, list[tuple[Activity, int]]]): (activité, rang du choix)
+                attribuées à chaque élève.
+            unassigned (list[str]): Élèves sans aucune activité (rien d’attribué et
+                aucune inscription existante).
+            preferences (dict[str, Preference]): Choix des élèves, par email.
+    """
+
+    assigned: dict = field(default_factory=dict)
+    unassigned: list = field(default_factory=list)
+    preferences: dict = field(default_factory=dict)
+
+    def by_rank(self) -> dict[int, int]:
+        """
+            Nombre d’activités attribuées par rang de choix (1 = premier choix).
+        """
+
+        ranks = {}
+        for activities in self.assigned.values():
+            for _, rank in activities:
+                ranks[rank + 1] = ranks.get(rank + 1, 0) + 1
+        return dict(sorted(ranks.items()))
+
+    def items(self) -> list[dict]:
+        """
+            Inscriptions à envoyer à `reserve_batch` (places et degrés du groupe compris).
+        """
+
+        items = []
+        for email, activities in self.assigned.items():
+            preference = self.preferences[email]
+            for activity, _ in activities:
+                items.append({"email": email, "name": preference.name, "choice": activity.label,
+                              "period": activity.period, "degree": preference.degree,
+                              "capacity": activity.capacity, "pool_degrees": list(activity.pool_degrees)})
+        return items
+
+
+def blocked_periods(period: int) -> tuple[int, ...]:
+    """
+        Périodes rendues indisponibles par une inscription (P910 bloque P9 et P10).
+    """
+
+    return (9, 10, 910) if period == 910 else (period, 910)
+
+
+def allocate(catalogue: Catalogue, preferences: list[Preference], counts: dict | None = None,
+             registered: dict | None = None) -> Allocation:
+    """
+        Répartit les élèves entre les activités selon leurs choix.
+
+        Args:
+            catalogue (Catalogue): Catalogue des activités (places).
+            preferences (list[Preference]): Choix classés des élèves.
+            counts (dict | None): Inscrits existants par (activité, période, degré)
+                (`RegistrationSnapshot.counts`), déduits des places.
+            registered (dict | None): Périodes déjà occupées par email (minuscules).
+
+        Returns:
+            Allocation: Activités attribuées et élèves sans activité.
+    """
+
+    counts = counts or {}
+    registered = registered or {}
+    allocation = Allocation(preferences={preference.email: preference for preference in preferences})
+
+    places = {}
+    for activity in catalogue.activities:
+        taken = sum(counts.get((activity.label, activity.period, degree), 0) for degree in activity.pool_degrees)
+        places[activity.id] = max(activity.capacity - taken, 0)
+
+    def candidates(preference, periods):
+        blocked = set()
+        for period in periods:
+            blocked.update(blocked_periods(period))
+        return [(activity, rank) for rank, activity in enumerate(preference.activities)
+                if activity.period not in blocked and preference.degree in activity.pool_degrees]
+
+    # 1re passe : au plus une activité par élève, toutes périodes confondues.
+    first = {preference.email: candidates(preference, registered.get(preference.email, ()))
+             for preference in preferences}
+    for email, (activity, rank) in _assign(first, places).items():
+        allocation.assigned[email] = [(activity, rank)]
+        places[activity.id] -= 1
+
+    # 2e passe : l’autre période pour les élèves placés en P9 ou en P10.
+    second = {}
+    for email, activities in allocation.assigned.items():
+        periods = list(registered.get(email, ())) + [activity.period for activity, _ in activities]
+        second[email] = candidates(allocation.preferences[email], periods)
+    for email, (activity, rank) in _assign(second, places).items():
+        allocation.assigned[email].append((activity, rank))
+
+    allocation.unassigned = sorted(email for email in first
+                                   if email not in allocation.assigned and not registered.get(email))
+    return allocation
+
+
+def _assign(candidates: dict, places: dict) -> dict:
+    """
+        Affectation d’au plus une activité par élève : flot maximum de coût minimum
+        (source → élève → activité → puits).
+
+        Args:
+            candidates (dict[str, list[tuple[Activity, int]]]): (activité, rang) possibles par élève.
+            places (dict[str, int]): Places restantes par identifiant d’activité.
+
+        Returns:
+            dict[str, tuple[Activity, int]]: Activité attribuée (et son rang) par élève.
+    """
+
+    emails = [email for email, options in candidates.items() if options]
+    activities = {}
+    for email in emails:
+        for activity, _ in candidates[email]:
+            if places.get(activity.id, 0) > 0:
+                activities.setdefault(activity.id, activity)
+    nodes = {activity_id: 2 + len(emails) + index for index, activity_id in enumerate(activities)}
+
+    flow = _MinCostFlow(2 + len(emails) + len(activities))
+    source, sink = 0, 1
+    edges = []
+    for index, email in enumerate(emails):
+        flow.add(source, 2 + index, 1, 0)
+        for activity, rank in candidates[email]:
+            if activity.id in nodes:
+                edges.append((flow.add(2 + index, nodes[activity.id], 1, (rank + 1) ** 2), email, activity, rank))
+    for activity_id, node in nodes.items():
+        flow.add(node, sink, places[activity_id], 0)
+
+    flow.run(source, sink)
+    return {email: (activity, rank) for edge, email, activity, rank in edges if flow.cap[edge] == 0}
+
+
+class _MinCostFlow:
+    """
+        Flot maximum de coût minimum par plus courts chemins successifs : potentiels
+        de Johnson + Dijkstra, puis tous les plus courts chemins d’une même longueur
+        sont saturés d’un coup (flot bloquant de Dinic sur les arcs de coût réduit nul).
+        Les coûts de rang étant petits, il y a peu de longueurs distinctes.
+    """
+
+    def __init__(self, nodes: int):
+        self.graph = [[] for _ in range(nodes)]
+        self.to = []
+        self.cap = []
+        self.cost = []
+
+    def add(self, u: int, v: int, capacity: int, cost: int) -> int:
+        """
+            Ajoute l’arc u → v (et son arc inverse) ; retourne l’indice de l’arc.
+        """
+
+        edge = len(self.to)
+        self.graph[u].append(edge)
+        self.to.append(v)
+        self.cap.append(capacity)
+        self.cost.append(cost)
+        self.graph[v].append(edge + 1)
+        self.to.append(u)
+        self.cap.append(0)
+        self.cost.append(-cost)
+        return edge
+
+    def run(self, source: int, sink: int) -> int:
+        graph, to, cap, cost = self.graph, self.to, self.cap, self.cost
+        nodes = len(graph)
+        potential = [0] * nodes
+        total = 0
+
+        while True:
+            # Plus courts chemins (coûts réduits positifs grâce aux potentiels).
+            distance = [_INFINITY] * nodes
+            distance[source] = 0
+            heap = [(0, source)]
+            while heap:
+                d, u = heapq.heappop(heap)
+                if d > distance[u]:
+                    continue
+                if u == sink:
+                    break
+                for edge in graph[u]:
+                    if cap[edge] > 0:
+                        v = to[edge]
+                        nd = d + cost[edge] + potential[u] - potential[v]
+                        if nd < distance[v]:
+                            distance[v] = nd
+                            heapq.heappush(heap, (nd, v))
+            if distance[sink] == _INFINITY:
+                return total
+
+            limit = distance[sink]
+            for u in range(nodes):
+                potential[u] += min(distance[u], limit)
+
+            # Flot bloquant sur les arcs admissibles (coût réduit nul).
+            while True:
+                level = self._levels(source, sink, potential)
+                if level[sink] < 0:
+                    break
+                current = [0] * nodes
+                while True:
+                    pushed = self._augment(source, sink, level, current, potential)
+                    if pushed == 0:
+                        break
+                    total += pushed
+
+    def _levels(self, source: int, sink: int, potential: list) -> list:
+        graph, to, cap, cost = self.graph, self.to, self.cap, self.cost
+        level = [-1] * len(graph)
+        level[source] = 0
+        queue = [source]
+        for u in queue:
+            if 0 <= level[sink] <= level[u]:
+                break  # les nœuds plus éloignés que le puits sont inutiles
+            for edge in graph[u]:
+                v = to[edge]
+                if level[v] < 0 and cap[edge] > 0 and cost[edge] + potential[u] - potential[v] == 0:
+                    level[v] = level[u] + 1
+                    queue.append(v)
+        return level
+
+    def _augment(self, source: int, sink: int, level: list, current: list, potential: list) -> int:
+        # Parcours en profondeur itératif (les chemins alternés peuvent être longs).
+        graph, to, cap, cost = self.graph, self.to, self.cap, self.cost
+        path = []
+        u = source
+        while True:
+            if u == sink:
+                pushed = min(cap[edge] for edge in path)
+                for edge in path:
+                    cap[edge] -= pushed
+                    cap[edge ^ 1] += pushed
+                return pushed
+
+            edges = graph[u]
+            index = current[u]
+            next_level = level[u] + 1
+            while index < len(edges):
+                edge = edges[index]
+                v = to[edge]
+                if cap[edge] > 0 and level[v] == next_level and cost[edge] + potential[u] - potential[v] == 0:
+                    break
+                index += 1
+            current[u] = index
+            if index < len(edges):
+                path.append(edge)
+                u = v
+                continue
+
+            # Impasse : on revient d’un arc et on passe au suivant.
+            if not path:
+                return 0
+            level[u] = -1
+            edge = path.pop()
+            u = to[edge ^ 1]
+            current[u] += 1
+
+
+def load_preferences(client: Client, session: str, catalogue: Catalogue) -> list[Preference]:
+    """
+        Lit les choix des élèves pour une session (table `preferences`).
+
+        Les choix qui ne correspondent plus au catalogue (activité supprimée ou
+        renommée) sont ignorés.
+    """
+
+    response = (client.table("preferences").select("email, name, degree, choice, period, rank")
+                .eq("session", session).order("email_normalized").order("rank").execute())
+
+    students = {}
+    for data in response.data:
+        email = data["email"].lower()
+        if email not in students:
+            students[email] = (data["name"], int(data["degree"]), [])
+        activity = catalogue.find(int(data["degree"]), int(data["period"]), data["choice"])
+        if activity is not None:
+            students[email][2].append(activity)
+
+    return [Preference(email, name, degree, tuple(activities))
+            for email, (name, degree, activities) in students.items()]
+
+
+def fetch_preferences(client: Client, session: str, email: str) -> list[dict]:
+    """
+        Choix d’un élève, du premier au dernier.
+    """
+
+    response = (client.table("preferences").select("choice, period, rank")
+                .eq("session", session).eq("email_normalized", email.lower()).order("rank").execute())
+    return response.data
+
+
+def save_preferences(client: Client, session: str, email: str, name: str, degree: int,
+                     activities: list[Activity]):
+    """
+        Remplace les choix d’un élève (fonction `save_preferences`, en une transaction).
+    """
+
+    client.rpc("save_preferences", {
+        "p_session": session,
+        "p_email": email,
+        "p_name": name,
+        "p_degree": degree,
+        "p_items": [{"choice": activity.label, "period": activity.period}
+                    for activity in activities[:MAX_PREFERENCES]]
+    }).execute()
+
+
+def write_allocation(client: Client, snapshot: RegistrationSnapshot, allocation: Allocation) -> tuple[int, list[dict]]:
+    """
+        Enregistre les inscriptions attribuées en une seule requête (`reserve_batch`,
+        mêmes vérifications que `reserve_option`) puis invalide l’instantané.
+
+        Returns:
+            tuple[int, list[dict]]: Nombre d’inscriptions ajoutées, et inscriptions
+                                    refusées par la base (élément de `items()` et
+                                    son statut, "full" ou "already_registered").
+    """
+
+    items = allocation.items()
+    if not items:
+        return 0, []
+
+    response = client.rpc("reserve_batch", {"p_session": snapshot.session, "p_items": items}).execute()
+    snapshot.invalidate()
+    refused = [{**item, "status": status} for item, status in zip(items, response.data) if status != RESERVED]
+    return len(items) - len(refused), refused
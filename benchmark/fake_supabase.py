@@ -0,0 +1,328 @@
+"""
+Client Supabase factice, en mémoire, pour les tests de charge.
+
+Reproduit la partie de l’API PostgREST utilisée par l’application (tables
+`students`, `options` et `preferences`, vues `option_counts` et `session_counts`,
+fonctions `not_registered_students`, `reserve_option`, `reserve_options`,
+`reserve_batch`, `archive_sessions` et `save_preferences`) et mesure chaque requête :
+nombre d’appels par table, octets échangés (JSON) et latence réseau simulée.
+
+Les fonctions de réservation sont exécutées sous un verrou, comme les fonctions
+Postgres (verrous consultatifs) : un dépassement de capacité mesuré par le test
+de charge vient donc de l’application, pas du client factice.
+"""
+
+
+import json
+import re
+import threading
+import time
+from types import SimpleNamespace
+
+
+class FakeResponse:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+class FakeStats:
+    """
+        Compteurs de requêtes partagés par toutes les sessions simulées.
+
+        Attributes:
+            requests (dict[str, int]): Nombre de requêtes par table, vue ou fonction.
+            bytes_sent (int): Octets envoyés à la base (corps des requêtes).
+            bytes_received (int): Octets reçus de la base (réponses).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    @property
+    def total(self) -> int:
+        return sum(self.requests.values())
+
+    def record(self, name: str, sent, received):
+        with self._lock:
+            self.requests[name] = self.requests.get(name, 0) + 1
+            self.bytes_sent += len(json.dumps(sent, default=str)) if sent is not None else 0
+            self.bytes_received += len(json.dumps(received, default=str))
+
+
+class FakeQuery:
+    def __init__(self, client: "FakeClient", name: str):
+        self._client = client
+        self._name = name
+        self._filters = []
+        self._columns = "*"
+        self._operation = "select"
+        self._payload = None
+        self._on_conflict = None
+        self._orders = []
+        self._limit = None
+        self._range = None
+
+    def select(self, columns: str = "*", count=None):
+        self._columns = columns
+        return self
+
+    def eq(self, column: str, value):
+        self._filters.append(lambda row: _value(row, column) == value)
+        return self
+
+    def neq(self, column: str, value):
+        self._filters.append(lambda row: _value(row, column) != value)
+        return self
+
+    def gt(self, column: str, value):
+        self._filters.append(lambda row: _value(row, column) > value)
+        return self
+
+    def gte(self, column: str, value):
+        self._filters.append(lambda row: _value(row, column) >= value)
+        return self
+
+    def lt(self, column: str, value):
+        self._filters.append(lambda row: _value(row, column) < value)
+        return self
+
+    def in_(self, column: str, values):
+        values = list(values)
+        self._filters.append(lambda row: _value(row, column) in values)
+        return self
+
+    def like(self, column: str, pattern: str):
+        expression = _like_regex(pattern)
+        self._filters.append(lambda row: expression.fullmatch(str(_value(row, column))) is not None)
+        return self
+
+    def ilike(self, column: str, pattern: str):
+        expression = _like_regex(pattern, re.IGNORECASE)
+        self._filters.append(lambda row: expression.fullmatch(str(_value(row, column))) is not None)
+        return self
+
+    def order(self, column: str, desc: bool = False):
+        self._orders.append((column, desc))
+        return self
+
+    def limit(self, size: int):
+        self._limit = size
+        return self
+
+    def range(self, start: int, end: int):
+        self._range = (start, end)
+        return self
+
+    def insert(self, data):
+        self._operation = "insert"
+        self._payload = data
+        return self
+
+    def upsert(self, data, on_conflict: str = "id", **kwargs):
+        self._operation = "upsert"
+        self._payload = data
+        self._on_conflict = on_conflict
+        return self
+
+    def delete(self):
+        self._operation = "delete"
+        return self
+
+    def execute(self) -> FakeResponse:
+        client = self._client
+        client.wait()
+        with client.lock:
+            data = self._execute(client)
+        client.stats.record(self._name, self._payload, data)
+        return FakeResponse(data, len(data))
+
+    def _execute(self, client: "FakeClient") -> list:
+        if self._operation in ("insert", "upsert"):
+            rows = self._payload if isinstance(self._payload, list) else [self._payload]
+            return [client.write(self._name, row, self._on_conflict) for row in rows]
+
+        rows = [row for row in client.read(self._name) if all(f(row) for f in self._filters)]
+        if self._operation == "delete":
+            client.tables[self._name] = [row for row in client.tables[self._name] if row not in rows]
+            return rows
+
+        for column, desc in reversed(self._orders):
+            rows.sort(key=lambda row: _value(row, column), reverse=desc)
+        if self._range is not None:
+            rows = rows[self._range[0]:self._range[1] + 1]
+        if self._limit is not None:
+            rows = rows[:self._limit]
+        if self._columns.strip() != "*":
+            columns = [column.strip() for column in self._columns.split(",")]
+            rows = [{column: _value(row, column) for column in columns} for row in rows]
+        else:
+            rows = [dict(row) for row in rows]
+        return rows
+
+
+class FakeClient:
+    """
+        Remplace `supabase.Client` (même interface pour table(), rpc() et execute()).
+
+        Args:
+            students (list[dict]): Lignes initiales de la table `students` (email, degree).
+            latency (float): Latence simulée par requête, en secondes.
+    """
+
+    def __init__(self, students: list, latency: float = 0.0):
+        self.tables = {"students": [], "options": []}
+        self.latency = latency
+        self.stats = FakeStats()
+        self.lock = threading.RLock()
+        self._sequence = 0
+        for student in students:
+            self.write("students", student)
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    from_ = table
+
+    def rpc(self, name: str, params: dict | None = None):
+        function = getattr(self, "_rpc_" + name)
+
+        def execute():
+            self.wait()
+            with self.lock:
+                data = function(**(params or {}))
+            self.stats.record("rpc/" + name, params, data)
+            return FakeResponse(data)
+
+        return SimpleNamespace(execute=execute)
+
+    def wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def write(self, name: str, row: dict, on_conflict: str | None = None) -> dict:
+        table = self.tables.setdefault(name, [])
+        if name == "options" and row.get("session") is None:
+            raise ValueError("options.session ne peut pas être nul")
+        if on_conflict:
+            keys = on_conflict.split(",")
+            for existing in table:
+                if all(_value(existing, key) == _value(row, key) for key in keys):
+                    existing.update(row)
+                    return dict(existing)
+        self._sequence += 1
+        row = {"id": self._sequence, **row}
+        table.append(row)
+        return dict(row)
+
+    def read(self, name: str) -> list:
+        if name == "option_counts":
+            counts = {}
+            for row in self.tables["options"]:
+                key = (row["session"], row["choice"], row["period"], row["degree"])
+                registered, last_id = counts.get(key, (0, 0))
+                counts[key] = (registered + 1, max(last_id, row["id"]))
+            return [{"session": session, "choice": choice, "period": period, "degree": degree,
+                     "registered": registered, "last_id": last_id}
+                    for (session, choice, period, degree), (registered, last_id) in counts.items()]
+
+        if name == "session_counts":
+            counts = {}
+            for row in self.tables["options"] + self.tables.get("options_archive", []):
+                key = (row["session"], row["choice"], row["period"])
+                counts[key] = counts.get(key, 0) + 1
+            return [{"session": session, "choice": choice, "period": period, "registered": registered}
+                    for (session, choice, period), registered in counts.items()]
+
+        return self.tables.setdefault(name, [])
+
+    def _rpc_not_registered_students(self, p_session):
+        registered = {(row["email"].lower(), row["degree"]) for row in self.tables["options"]
+                      if row.get("session") == p_session}
+        return [{"email": row["email"], "degree": row["degree"]} for row in self.tables["students"]
+                if row["degree"] in (1, 2, 3) and (row["email"].lower(), row["degree"]) not in registered]
+
+    def _rpc_reserve_option(self, p_session, p_email, p_name, p_choice, p_period, p_degree,
+                            p_capacity=None, p_pool_degrees=None):
+        status = self._check(p_session, p_email, p_choice, p_period, p_degree, p_capacity, p_pool_degrees)
+        if status == "ok":
+            self.write("options", {"session": p_session, "email": p_email, "name": p_name, "choice": p_choice,
+                                   "period": p_period, "degree": p_degree})
+        return status
+
+    def _rpc_reserve_options(self, p_session, p_email, p_name, p_items):
+        periods = []
+        for item in p_items:
+            if any(period in _blocked(item["period"]) for period in periods):
+                return {"status": "already_registered", "choice": item["choice"], "period": item["period"]}
+            status = self._check(p_session, p_email, item["choice"], item["period"], item["degree"],
+                                 item.get("capacity"), item.get("pool_degrees"))
+            if status != "ok":
+                return {"status": status, "choice": item["choice"], "period": item["period"]}
+            periods.append(item["period"])
+
+        for item in p_items:
+            self.write("options", {"session": p_session, "email": p_email, "name": p_name, "choice": item["choice"],
+                                   "period": item["period"], "degree": item["degree"]})
+        return {"status": "ok"}
+
+    def _rpc_reserve_batch(self, p_session, p_items):
+        return [self._rpc_reserve_option(p_session, item["email"], item["name"], item["choice"], item["period"],
+                                         item["degree"], item.get("capacity"), item.get("pool_degrees"))
+                for item in p_items]
+
+    def _rpc_archive_sessions(self, p_before):
+        moved = [row for row in self.tables["options"] if row["session"] < p_before]
+        self.tables["options"] = [row for row in self.tables["options"] if row not in moved]
+        self.tables.setdefault("options_archive", []).extend(moved)
+        return len(moved)
+
+    def _rpc_save_preferences(self, p_session, p_email, p_name, p_degree, p_items):
+        self.tables["preferences"] = [row for row in self.tables.get("preferences", [])
+                                      if row["session"] != p_session or row["email"].lower() != p_email.lower()]
+        for rank, item in enumerate(p_items, start=1):
+            self.write("preferences", {"session": p_session, "email": p_email, "name": p_name, "degree": p_degree,
+                                       "choice": item["choice"], "period": item["period"], "rank": rank})
+        return len(p_items)
+
+    def _check(self, session, email, choice, period, degree, capacity, pool_degrees) -> str:
+        options = [row for row in self.tables["options"] if row["session"] == session]
+        if any(row["email"].lower() == email.lower() and row["period"] in _blocked(period) for row in options):
+            return "already_registered"
+        pool = pool_degrees or [degree]
+        registered = sum(1 for row in options
+                         if row["choice"] == choice and row["period"] == period and row["degree"] in pool)
+        if capacity is not None and registered >= capacity:
+            return "full"
+        return "ok"
+
+
+def _value(row: dict, column: str):
+    if column == "email_normalized":
+        return (row.get("email") or "").lower() or None
+    return row.get(column)
+
+
+def _like_regex(pattern: str, flags: int = 0) -> re.Pattern:
+    parts = []
+    escaped = False
+    for char in pattern:
+        if escaped:
+            parts.append(re.escape(char))
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char in "%*":
+            parts.append(".*")
+        elif char == "_":
+            parts.append(".")
+        else:
+            parts.append(re.escape(char))
+    return re.compile("".join(parts), flags | re.DOTALL)
+
+
+def _blocked(period: int) -> tuple:
+    return (9, 10, 910) if period == 910 else (period, 910)
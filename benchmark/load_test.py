@@ -0,0 +1,275 @@
+"""
+Test de charge de l’ouverture des inscriptions, sans toucher à la base de production.
+
+main.py est exécuté avec streamlit.testing.v1.AppTest contre un client Supabase
+factice (benchmark/fake_supabase.py). Des élèves simulés (st.user factice, degrés
+variés) arrivent par vagues : tous les élèves d’une vague ouvrent la page, puis
+cliquent sur "S'inscrire" dans un ordre aléatoire, avec des places affichées
+devenues périmées entre-temps. Un professeur ouvre ensuite les groupes et
+télécharge l’export Excel.
+
+Rapport :
+- latence de rendu p50 / p99 (chargement de la page, inscription, vue des groupes),
+- requêtes et octets échangés avec la base par exécution du script,
+- nombre de places attribuées au-delà de la capacité (doit rester à 0),
+- durée et taille de l’export Excel.
+
+Utilisation (depuis la racine du dépôt) :
+    python -m benchmark.load_test --students 300 --wave 50 --latency 20
+
+Le code de sortie est 1 en cas de surréservation ou si un seuil (--max-p99,
+--max-queries) est dépassé.
+
+Limites : AppTest ne peut pas exécuter plusieurs sessions en même temps (état
+global du runtime), les sessions d’une vague sont donc entrelacées plutôt que
+simultanées. AppTest ne sait pas non plus relancer un seul fragment : les relances
+st.rerun(scope="fragment") sont jouées comme des relances complètes (la latence
+mesurée est un majorant). L’abonnement Realtime n’est pas démarré : l’instantané
+des inscriptions fonctionne en mode TTL.
+"""
+
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import streamlit
+import streamlit.user_info
+from streamlit.errors import StreamlitAPIException
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+from streamlit.testing.v1 import AppTest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import database  # noqa: E402
+import live_counts  # noqa: E402
+from catalogue import load_catalogue  # noqa: E402
+from benchmark.fake_supabase import FakeClient  # noqa: E402
+
+USER_KEY = "_benchmark_user"
+PROF_EMAIL = "prof.benchmark@isa-florenville.be"
+DATA_FILES = ("options.json", "options_p910.json", "isa_icon.jpg")
+
+
+class Results:
+    """
+        Mesures collectées par les sessions simulées.
+    """
+
+    def __init__(self):
+        self.latencies = {}
+        self.errors = []
+        self.full = 0
+        self.export = None
+
+    def add(self, phase: str, seconds: float):
+        self.latencies.setdefault(phase, []).append(seconds)
+
+    def error(self, message: str):
+        self.errors.append(message)
+
+    @property
+    def runs(self) -> int:
+        return sum(len(values) for values in self.latencies.values())
+
+
+def percentile(values: list, ratio: float) -> float:
+    """
+        Percentile par rang le plus proche (values non vide).
+    """
+
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(ratio * len(ordered) + 0.5) - 1))]
+
+
+def prepare_workdir(focus_date: date) -> str:
+    """
+        Copie les fichiers de données dans un dossier temporaire, avec une fenêtre
+        d’inscription ouverte depuis la veille pour le Focus Time du `focus_date`.
+    """
+
+    workdir = tempfile.mkdtemp(prefix="focus-time-bench-")
+    for name in DATA_FILES:
+        shutil.copy(os.path.join(ROOT, name), workdir)
+
+    today = date.today()
+    with open(os.path.join(workdir, "registration_open.json"), "w", encoding="utf-8") as file:
+        json.dump({"from": (today - timedelta(days=1)).strftime("%d/%m/%Y"), "from_hour": "17h30",
+                   "for": focus_date.strftime("%d/%m/%Y")}, file)
+    return workdir
+
+
+def patch_streamlit(results: Results):
+    """
+        Adapte Streamlit au test : utilisateur lu dans la session simulée, relances
+        de fragment jouées comme relances complètes, export Excel généré au rendu
+        du bouton (simule le clic).
+    """
+
+    def get_user_info():
+        ctx = get_script_run_ctx()
+        if ctx is None or USER_KEY not in ctx.session_state:
+            return {}
+        return {"is_logged_in": True, **ctx.session_state[USER_KEY]}
+
+    rerun = streamlit.rerun
+
+    def rerun_app(*, scope="app"):
+        try:
+            rerun(scope=scope)
+        except StreamlitAPIException:
+            rerun()
+
+    download_button = streamlit.download_button
+
+    def download_and_measure(label, data, *args, **kwargs):
+        if callable(data):
+            start = time.perf_counter()
+            data = data()
+            results.export = (time.perf_counter() - start, len(data))
+        return download_button(label, data, *args, **kwargs)
+
+    streamlit.user_info._get_user_info = get_user_info
+    streamlit.rerun = rerun_app
+    streamlit.download_button = download_and_measure
+    live_counts.LiveCounts.start = lambda self: self
+
+
+def new_session(email: str, name: str, timeout: float) -> AppTest:
+    at = AppTest.from_file(os.path.join(ROOT, "main.py"), default_timeout=timeout)
+    at.secrets["SUPABASE_URL"] = "http://localhost:54321"
+    at.secrets["SUPABASE_KEY"] = "benchmark"
+    at.session_state[USER_KEY] = {"email": email, "name": name}
+    return at
+
+
+def timed_run(at: AppTest, results: Results, phase: str) -> AppTest:
+    start = time.perf_counter()
+    at.run()
+    results.add(phase, time.perf_counter() - start)
+    if at.exception:
+        results.error(f"{phase} : {at.exception[0].message}")
+    return at
+
+
+def simulate_wave(emails: list, rng: random.Random, attempts: int, timeout: float, results: Results):
+    """
+        Une vague d’élèves ouvre la page, puis chacun clique sur "S'inscrire"
+        (activité au hasard parmi celles affichées disponibles) jusqu’à obtenir
+        une place ou épuiser ses tentatives.
+    """
+
+    sessions = [timed_run(new_session(email, email.split("@")[0], timeout), results, "page") for email in emails]
+    for _ in range(attempts):
+        rng.shuffle(sessions)
+        for at in sessions:
+            buttons = [button for button in at.button if button.label == "S'inscrire" and not button.disabled]
+            if not buttons:
+                continue
+            rng.choice(buttons).click()
+            timed_run(at, results, "inscription")
+            if any(error.value == "Le groupe vient d'être complété" for error in at.error):
+                results.full += 1
+
+
+def simulate_prof(timeout: float, results: Results):
+    at = timed_run(new_session(PROF_EMAIL, "Prof Benchmark", timeout), results, "page prof")
+    next(button for button in at.button if button.label == "Voir les groupes").click()
+    timed_run(at, results, "groupes")
+
+
+def oversubscription(client: FakeClient, session: str) -> int:
+    """
+        Nombre de places attribuées au-delà de la capacité, toutes activités confondues.
+    """
+
+    catalogue = load_catalogue()
+    excess = 0
+    for activity in catalogue.activities:
+        registered = sum(1 for row in client.tables["options"] if row["session"] == session
+                         if row["choice"] == activity.label and row["period"] == activity.period
+                         and row["degree"] in activity.pool_degrees)
+        excess += max(0, registered - activity.capacity)
+    return excess
+
+
+def report(args, client: FakeClient, session: str, results: Results, elapsed: float) -> bool:
+    print(f"Élèves simulés : {args.students} (vagues de {args.wave}), latence base {args.latency} ms")
+    print(f"Durée totale : {elapsed:.1f} s, {results.runs} exécutions du script")
+    print()
+    print(f"{'Phase':<14}{'n':>6}{'p50 (ms)':>12}{'p99 (ms)':>12}")
+    for phase, values in results.latencies.items():
+        print(f"{phase:<14}{len(values):>6}{percentile(values, .5) * 1000:>12.0f}{percentile(values, .99) * 1000:>12.0f}")
+    print()
+
+    stats = client.stats
+    queries = stats.total / max(results.runs, 1)
+    print(f"Requêtes : {stats.total} ({queries:.2f} par exécution)")
+    for name, count in sorted(stats.requests.items(), key=lambda item: -item[1]):
+        print(f"  {name:<28}{count:>8}")
+    print(f"Octets envoyés : {stats.bytes_sent}, reçus : {stats.bytes_received} "
+          f"({(stats.bytes_sent + stats.bytes_received) / max(results.runs, 1):.0f} par exécution)")
+    print(f"Inscriptions : {len(client.tables['options'])}, refus \"groupe complet\" : {results.full}")
+    if results.export is not None:
+        print(f"Export Excel : {results.export[0] * 1000:.0f} ms, {results.export[1]} octets")
+
+    excess = oversubscription(client, session)
+    print(f"Surréservation : {excess} place(s)")
+    for message in sorted(set(results.errors)):
+        print(f"Erreur : {message}")
+
+    all_latencies = [value for values in results.latencies.values() for value in values]
+    ok = excess == 0 and not results.errors
+    if args.max_p99 is not None and percentile(all_latencies, .99) * 1000 > args.max_p99:
+        print(f"Seuil dépassé : p99 > {args.max_p99} ms")
+        ok = False
+    if args.max_queries is not None and queries > args.max_queries:
+        print(f"Seuil dépassé : plus de {args.max_queries} requêtes par exécution")
+        ok = False
+    return ok
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Test de charge de l’ouverture des inscriptions")
+    parser.add_argument("--students", type=int, default=200, help="nombre d’élèves simulés")
+    parser.add_argument("--wave", type=int, default=50, help="élèves qui ouvrent la page en même temps")
+    parser.add_argument("--latency", type=float, default=0, help="latence simulée par requête (ms)")
+    parser.add_argument("--attempts", type=int, default=3, help="clics maximum par élève")
+    parser.add_argument("--timeout", type=float, default=60, help="délai maximum d’une exécution (s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-p99", type=float, default=None, help="seuil de latence p99 (ms)")
+    parser.add_argument("--max-queries", type=float, default=None, help="seuil de requêtes par exécution")
+    args = parser.parse_args()
+
+    students = [{"email": f"eleve{i}.nom{i}@isa-florenville.be", "degree": 1 + i % 3}
+                for i in range(1, args.students + 1)]
+    client = FakeClient(students + [{"email": PROF_EMAIL, "degree": 4}], latency=args.latency / 1000)
+    database.create_client = lambda url, key, *a, **k: client
+
+    results = Results()
+    patch_streamlit(results)
+    focus_date = date.today() + timedelta(days=7)
+    os.chdir(prepare_workdir(focus_date))
+    streamlit.cache_data.clear()
+    streamlit.cache_resource.clear()
+
+    rng = random.Random(args.seed)
+    emails = [student["email"] for student in students]
+    start = time.perf_counter()
+    for index in range(0, len(emails), args.wave):
+        simulate_wave(emails[index:index + args.wave], rng, args.attempts, args.timeout, results)
+    simulate_prof(args.timeout, results)
+    elapsed = time.perf_counter() - start
+
+    return 0 if report(args, client, focus_date.isoformat(), results, elapsed) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
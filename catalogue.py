@@ -0,0 +1,186 @@
+"""
+Catalogue des activités du Focus Time.
+
+Les fichiers options.json (activités P9 et P10) et options_p910.json (activités
+sur deux périodes) sont lus une seule fois et transformés en objets `Activity`,
+indexés par identifiant et par (degré, période).
+
+Une session du Focus Time peut avoir son propre catalogue dans
+sessions/<date ISO>/options.json et options_p910.json (ex. sessions/2026-06-09/) ;
+à défaut, les fichiers à la racine sont utilisés.
+
+Structure des fichiers :
+    { "D1": {"Nom de l’activité": places, ...}, "D2": {...}, "D3": {...}, "D2_D3": {...} }
+Les activités "D2_D3" sont communes aux élèves de D2 et de D3 (places partagées).
+"""
+
+
+import json
+import os
+from dataclasses import dataclass
+
+SCOPES = ("D1", "D2", "D3", "D2_D3")
+SHARED_SCOPE = "D2_D3"
+SESSIONS_DIR = "sessions"
+
+
+@dataclass(frozen=True)
+class Activity:
+    """
+        Une activité proposée sur une période.
+
+        Attributes:
+            id (str): Identifiant unique, ex. "D2/P9/Math 3ème (Herbeuval - Local 3A)".
+            label (str): Nom de l’activité (colonne `choice` de la table `options`).
+            scope (str): Degré concerné ("D1", "D2", "D3" ou "D2_D3").
+            period (int): Période (9, 10 ou 910).
+            capacity (int): Nombre de places.
+    """
+
+    id: str
+    label: str
+    scope: str
+    period: int
+    capacity: int
+
+    @property
+    def pool_degrees(self) -> tuple[int, ...]:
+        """
+            Degrés qui partagent les places de l’activité.
+        """
+
+        if self.scope == SHARED_SCOPE:
+            return 2, 3
+        return (int(self.scope[1]),)
+
+    @property
+    def degree(self) -> int:
+        """
+            Degré enregistré lors d’une inscription manuelle (premier degré du groupe).
+        """
+
+        return self.pool_degrees[0]
+
+    @property
+    def manual_capacity(self) -> int | None:
+        """
+            Places pour une inscription faite par un professeur : None (pas de limite)
+            pour une activité P9 et P10 à 0 place.
+        """
+
+        if self.period == 910 and self.capacity == 0:
+            return None
+        return self.capacity
+
+
+class Catalogue:
+    """
+        Ensemble des activités, avec des index pour des recherches en O(1).
+
+        Attributes:
+            activities (tuple[Activity, ...]): Toutes les activités, dans l’ordre des fichiers.
+            by_id (dict[str, Activity]): Activités par identifiant.
+            key (tuple): Dates de modification des fichiers sources (clé de cache).
+    """
+
+    def __init__(self, activities, key=()):
+        self.activities = tuple(activities)
+        self.key = key
+        self.by_id = {activity.id: activity for activity in self.activities}
+
+        self._by_scope = {}
+        self._by_degree = {}
+        self._by_label = {}
+        for activity in self.activities:
+            self._by_scope.setdefault((activity.scope, activity.period), []).append(activity)
+        for degree in (1, 2, 3):
+            for period in (9, 10, 910):
+                activities = list(self._by_scope.get((f"D{degree}", period), []))
+                if degree > 1:
+                    activities += self._by_scope.get((SHARED_SCOPE, period), [])
+                self._by_degree[(degree, period)] = activities
+                for activity in activities:
+                    self._by_label[(degree, period, activity.label)] = activity
+
+    def in_scope(self, scope: str, period: int) -> list[Activity]:
+        """
+            Activités d’un degré du fichier ("D1", ..., "D2_D3") pour une période.
+        """
+
+        return self._by_scope.get((scope, period), [])
+
+    def for_student(self, degree: int, period: int) -> list[Activity]:
+        """
+            Activités accessibles à un élève d’un degré donné pour une période
+            (activités communes D2_D3 comprises).
+        """
+
+        return self._by_degree.get((degree, period), [])
+
+    def find(self, degree: int, period: int, label: str) -> Activity | None:
+        """
+            Activité accessible à un élève d’un degré donné, retrouvée par son nom.
+
+            Returns:
+                Activity | None: L’activité, ou None si elle n’existe pas pour ce degré et cette période.
+        """
+
+        return self._by_label.get((degree, period, label))
+
+    def for_period(self, period: int) -> list[Activity]:
+        """
+            Toutes les activités d’une période, tous degrés confondus.
+        """
+
+        return [activity for scope in SCOPES for activity in self.in_scope(scope, period)]
+
+
+def load_catalogue(options_path: str = "options.json", options_p910_path: str = "options_p910.json") -> Catalogue:
+    """
+        Lit les fichiers d’activités et construit le catalogue.
+
+        Args:
+            options_path (str): Fichier des activités P9 et P10.
+            options_p910_path (str): Fichier des activités P9 et P10 combinées.
+
+        Returns:
+            Catalogue: Catalogue des activités.
+    """
+
+    activities = []
+    for path, periods in ((options_path, (9, 10)), (options_p910_path, (910,))):
+        with open(path, "r", encoding="utf-8") as file:
+            options = json.load(file)
+        for period in periods:
+            for scope in SCOPES:
+                for label, capacity in options.get(scope, {}).items():
+                    activities.append(Activity(f"{scope}/P{period}/{label}", label, scope, period, int(capacity)))
+
+    return Catalogue(activities, key=catalogue_key(options_path, options_p910_path))
+
+
+def catalogue_files(session: str | None = None) -> tuple[str, str]:
+    """
+        Fichiers d’activités d’une session : ceux de sessions/<session>/ s’ils
+        existent, sinon ceux de la racine.
+
+        Args:
+            session (str | None): Session du Focus Time (date ISO).
+
+        Returns:
+            tuple[str, str]: Chemins de options.json et options_p910.json.
+    """
+
+    files = []
+    for name in ("options.json", "options_p910.json"):
+        path = os.path.join(SESSIONS_DIR, session, name) if session else name
+        files.append(path if os.path.exists(path) else name)
+    return files[0], files[1]
+
+
+def catalogue_key(options_path: str = "options.json", options_p910_path: str = "options_p910.json") -> tuple:
+    """
+        Clé d’invalidation du catalogue : dates de modification des fichiers.
+    """
+
+    return os.path.getmtime(options_path), os.path.getmtime(options_p910_path)
@@ -0,0 +1,202 @@
+"""
+Accès résilient à la base Supabase.
+
+- un seul client httpx par processus, partagé par toutes les sessions : connexions
+  gardées ouvertes (keep-alive), HTTP/2, délais d’attente bornés,
+- nouvelles tentatives en cas d’erreur réseau ou de réponse d’erreur de la
+  passerelle (502, 503, 504... sans code PostgREST ni SQLSTATE), avec une attente exponentielle
+  bornée et aléatoire (jitter) pour ne pas renvoyer toutes les requêtes en même temps,
+- disjoncteur : après plusieurs échecs consécutifs, les requêtes échouent
+  immédiatement pendant quelques secondes au lieu de surcharger la base.
+
+Une requête qui échoue malgré tout lève `DatabaseUnavailable` : l’application
+continue alors avec les dernières données connues (instantané des inscriptions,
+cache de session) au lieu de relancer le script en boucle.
+
+Les écritures (insert, upsert, update, delete, fonctions) ne sont renvoyées que si
+la requête n’a pas pu partir (échec de connexion) : une réponse perdue ne doit pas
+produire une deuxième inscription. Une erreur de la base elle-même (code PGRST ou
+SQLSTATE : contrainte, droits...) est transmise telle quelle.
+"""
+
+
+import logging
+import random
+import threading
+import time
+
+import httpx
+from postgrest.exceptions import APIError
+from supabase import Client, create_client
+from supabase.lib.client_options import SyncClientOptions
+
+RETRIES = 3  # nouvelles tentatives après le premier échec
+BACKOFF_BASE = 0.2  # secondes, doublées à chaque tentative
+BACKOFF_MAX = 2.0  # secondes d’attente au maximum entre deux tentatives
+BREAKER_THRESHOLD = 5  # échecs consécutifs avant d’ouvrir le disjoncteur
+BREAKER_RESET = 15  # secondes avant de laisser passer une requête d’essai
+
+TIMEOUT = httpx.Timeout(10.0, connect=5.0)
+LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=30)
+
+WRITE_METHODS = ("insert", "upsert", "update", "delete")
+UNSENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+logger = logging.getLogger(__name__)
+
+
+class DatabaseUnavailable(Exception):
+    """
+        La base ne répond pas (nouvelles tentatives épuisées ou disjoncteur ouvert).
+    """
+
+
+class CircuitBreaker:
+    """
+        Disjoncteur partagé par toutes les requêtes du processus.
+
+        Fermé : les requêtes passent. Ouvert (après `threshold` échecs consécutifs) :
+        les requêtes sont refusées pendant `reset_after` secondes, puis une seule
+        requête d’essai est autorisée ; son succès referme le disjoncteur.
+
+        Args:
+            threshold (int): Échecs consécutifs avant ouverture.
+            reset_after (float): Durée d’ouverture, en secondes.
+    """
+
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, reset_after: float = BREAKER_RESET):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    def allow(self) -> bool:
+        """
+            Indique si une requête peut partir.
+        """
+
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at >= self.reset_after:
+                # Requête d’essai : les autres restent bloquées jusqu’à son résultat.
+                self._opened_at = time.monotonic()
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+
+    def failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.threshold:
+                if self._opened_at is None:
+                    logger.warning("Base injoignable : disjoncteur ouvert pour %s s", self.reset_after)
+                self._opened_at = time.monotonic()
+
+
+class ResilientClient:
+    """
+        Enveloppe du client Supabase : chaque `execute()` passe par le disjoncteur
+        et est renvoyé en cas d’erreur réseau. Le reste de l’interface est transmis
+        tel quel au client.
+
+        Args:
+            client (Client): Client Supabase.
+            breaker (CircuitBreaker | None): Disjoncteur (un nouveau par défaut).
+    """
+
+    def __init__(self, client: Client, breaker: CircuitBreaker | None = None):
+        self._client = client
+        self.breaker = breaker or CircuitBreaker()
+
+    def table(self, name: str):
+        return _ResilientQuery(self._client.table(name), self.breaker, write=False)
+
+    from_ = table
+
+    def rpc(self, name: str, *args, **kwargs):
+        return _ResilientQuery(self._client.rpc(name, *args, **kwargs), self.breaker, write=True)
+
+    def __getattr__(self, attribute):
+        return getattr(self._client, attribute)
+
+
+class _ResilientQuery:
+    def __init__(self, builder, breaker: CircuitBreaker, write: bool):
+        self._builder = builder
+        self._breaker = breaker
+        self._write = write
+
+    def execute(self):
+        if not self._breaker.allow():
+            raise DatabaseUnavailable("Disjoncteur ouvert")
+
+        for attempt in range(RETRIES + 1):
+            try:
+                response = self._builder.execute()
+            except httpx.TransportError as error:
+                if attempt == RETRIES or (self._write and not isinstance(error, UNSENT_ERRORS)):
+                    self._breaker.failure()
+                    raise DatabaseUnavailable(str(error) or type(error).__name__) from error
+                time.sleep(random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)))
+            except APIError as error:
+                if not is_gateway_error(error):
+                    raise
+                # Écriture peut-être déjà reçue par la base : pas de nouvel envoi
+                if attempt == RETRIES or self._write:
+                    self._breaker.failure()
+                    raise DatabaseUnavailable(error.message or f"Erreur {error.code}") from error
+                time.sleep(random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt)))
+            else:
+                self._breaker.success()
+                return response
+
+    def __getattr__(self, attribute):
+        value = getattr(self._builder, attribute)
+        if not callable(value):
+            return value
+
+        def chain(*args, **kwargs):
+            result = value(*args, **kwargs)
+            if not hasattr(result, "execute"):
+                return result
+            return _ResilientQuery(result, self._breaker, self._write or attribute in WRITE_METHODS)
+        return chain
+
+
+def is_gateway_error(error: APIError) -> bool:
+    """
+        Indique si une erreur vient de la passerelle (surcharge, redémarrage) et non
+        de PostgREST : pas de code, ou seulement un statut HTTP 5xx (réponse qui
+        n’est pas du JSON). Les codes PGRST... et SQLSTATE (5 caractères) sont
+        des erreurs de la requête elle-même.
+    """
+
+    code = "" if error.code is None else str(error.code)
+    return code == "" or (len(code) == 3 and code.isdigit() and code.startswith("5"))
+
+
+def connect(url: str, key: str) -> ResilientClient:
+    """
+        Crée le client Supabase du processus, avec son client httpx partagé.
+
+        Args:
+            url (str): URL du projet Supabase.
+            key (str): Clé Supabase.
+
+        Returns:
+            ResilientClient: Client prêt à l’emploi.
+    """
+
+    http_client = httpx.Client(http2=True, timeout=TIMEOUT, limits=LIMITS, follow_redirects=True)
+    client = create_client(url, key, options=SyncClientOptions(httpx_client=http_client))
+    return ResilientClient(client)
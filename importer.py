@@ -0,0 +1,274 @@
+"""
+Import en masse d’élèves et d’inscriptions (réservé aux professeurs).
+
+Formats acceptés (CSV ou XLSX) :
+- liste d’élèves : colonnes `email` et `degree`,
+- liste d’inscriptions : colonnes `email`, `choice` et `period` (P9, P10 ou P910),
+  éventuellement `degree` pour un élève qui n’est pas encore dans la table `students`,
+- fichier Excel au format de l’export ("Exporter en fichier Excel") : une feuille
+  par degré, un bloc par période, les élèves sont retrouvés par leur nom.
+
+Le fichier est lu ligne par ligne, chaque ligne est validée en mémoire (catalogue,
+places restantes, une seule inscription par période) puis les lignes valides sont
+envoyées par lots. Les inscriptions passent par la fonction `reserve_batch` : la
+base revérifie places et périodes sous verrou, les inscriptions faites par les
+élèves pendant l’import sont donc comptées. Les lignes refusées sont listées avec
+leur motif.
+"""
+
+
+import csv
+import io
+from dataclasses import dataclass, field
+
+from openpyxl import load_workbook
+from postgrest.exceptions import APIError
+from supabase import Client
+
+from catalogue import Catalogue
+from registrations import DEGREE_PROF, RESERVED, FULL, RegistrationSnapshot, display_name, sort_name
+
+CHUNK_SIZE = 500  # lignes par requête
+
+EXPORT_SHEETS = {"D1": "D1", "D2": "D2", "D3": "D3", "D2-D3": "D2_D3"}
+
+
+@dataclass
+class ImportReport:
+    """
+        Résultat d’un import.
+
+        Attributes:
+            students (int): Élèves ajoutés ou mis à jour.
+            registrations (int): Inscriptions ajoutées.
+            skipped (int): Inscriptions déjà présentes (ignorées).
+            errors (list[dict]): Lignes refusées {"ligne", "email", "erreur"}.
+    """
+
+    students: int = 0
+    registrations: int = 0
+    skipped: int = 0
+    errors: list = field(default_factory=list)
+
+    def error(self, location: str, email: str | None, message: str):
+        self.errors.append({"ligne": location, "email": email or "", "erreur": message})
+
+
+def parse_period(value) -> int | None:
+    """
+        Convertit "P9", "9", "P910", 910... en période (9, 10 ou 910).
+    """
+
+    text = str(value).strip().upper().removeprefix("P")
+    if text.endswith(".0"):
+        text = text[:-2]
+    if text in ("9", "10", "910"):
+        return int(text)
+    return None
+
+
+def parse_degree(value) -> int | None:
+    """
+        Convertit "D2", "2", 2.0... en degré (1 à 4, 4 = professeur).
+    """
+
+    text = str(value).strip().upper().removeprefix("D")
+    if text.endswith(".0"):
+        text = text[:-2]
+    if text in ("1", "2", "3", "4"):
+        return int(text)
+    return None
+
+
+def read_records(file, file_name: str):
+    """
+        Lit un fichier CSV ou XLSX ligne par ligne.
+
+        Args:
+            file: Fichier téléversé (objet binaire).
+            file_name (str): Nom du fichier (l’extension détermine le format).
+
+        Yields:
+            tuple[str, dict]: Emplacement de la ligne ("ligne 3", "D2 ligne 5"...) et
+                              valeurs de la ligne (clés en minuscules). Pour le format
+                              de l’export, les clés sont "name", "choice", "period" et "scope".
+    """
+
+    if file_name.lower().endswith(".csv"):
+        text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+        sample = text.read(4096)
+        text.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+        except csv.Error:
+            dialect = csv.excel
+        for index, row in enumerate(csv.DictReader(text, dialect=dialect), start=2):
+            yield f"ligne {index}", {key.strip().lower(): (value or "").strip()
+                                     for key, value in row.items() if key is not None}
+        return
+
+    wb = load_workbook(file, read_only=True, data_only=True)
+    try:
+        if "D1" in wb.sheetnames and wb["D1"]["A1"].value in ("P9", "P10", "P910"):
+            yield from _read_export(wb)
+            return
+
+        rows = wb.worksheets[0].iter_rows(values_only=True)
+        header = [str(value).strip().lower() if value is not None else "" for value in next(rows, ())]
+        for index, row in enumerate(rows, start=2):
+            if all(value is None for value in row):
+                continue
+            yield f"ligne {index}", {key: "" if value is None else str(value).strip()
+                                     for key, value in zip(header, row) if key}
+    finally:
+        wb.close()
+
+
+def _read_export(wb):
+    for sheet_title, scope in EXPORT_SHEETS.items():
+        if sheet_title not in wb.sheetnames:
+            continue
+
+        period = None
+        choices = []
+        for index, row in enumerate(wb[sheet_title].iter_rows(values_only=True), start=1):
+            first = parse_period(row[0]) if row and row[0] is not None else None
+            if first is not None:
+                period = first
+                choices = list(row[1:])
+                continue
+            for choice, name in zip(choices, row[1:]):
+                if choice and name:
+                    yield f"{sheet_title} ligne {index}", {"name": str(name).strip(), "choice": choice,
+                                                          "period": period, "scope": scope}
+
+
+def import_file(client: Client, snapshot: RegistrationSnapshot, catalogue: Catalogue, file, file_name: str) -> ImportReport:
+    """
+        Importe un fichier d’élèves et/ou d’inscriptions.
+
+        Args:
+            client (Client): Client Supabase.
+            snapshot (RegistrationSnapshot): Instantané des inscriptions de la session
+                                             (places et inscriptions existantes, session
+                                             des nouvelles inscriptions), invalidé à la fin.
+            catalogue (Catalogue): Catalogue des activités.
+            file: Fichier téléversé.
+            file_name (str): Nom du fichier.
+
+        Returns:
+            ImportReport: Nombre de lignes importées et lignes refusées.
+    """
+
+    report = ImportReport()
+
+    response = client.table("students").select("email, degree").execute()
+    degrees = {student["email"].lower(): int(student["degree"]) for student in response.data}
+    emails_by_name = {}
+    for email in degrees:
+        emails_by_name.setdefault(sort_name(email).lower(), []).append(email)
+
+    snapshot.load_rows()
+    used = dict(snapshot.counts)
+    periods_taken = {email: {registration.period for registration in rows} for email, rows in snapshot.by_email.items()}
+    existing = {(email, registration.choice, registration.period)
+                for email, rows in snapshot.by_email.items() for registration in rows}
+
+    students = {}
+    options = []
+    for location, record in read_records(file, file_name):
+        if "name" in record:
+            candidates = emails_by_name.get(record["name"].lower(), [])
+            if len(candidates) != 1:
+                report.error(location, None, f"{record['name']} : élève introuvable ou homonyme")
+                continue
+            email = candidates[0]
+        else:
+            email = record.get("email", "").lower()
+            if "@" not in email:
+                report.error(location, email, "Adresse email invalide")
+                continue
+
+        if record.get("degree") and not record.get("choice"):
+            # Ligne de la liste d’élèves
+            degree = parse_degree(record["degree"])
+            if degree is None:
+                report.error(location, email, f"Degré invalide : {record['degree']}")
+                continue
+            students[email] = {"email": email, "degree": degree}
+            degrees[email] = degree
+            continue
+
+        if email not in degrees and record.get("degree"):
+            degree = parse_degree(record["degree"])
+            if degree is not None and degree != DEGREE_PROF:
+                students[email] = {"email": email, "degree": degree}
+                degrees[email] = degree
+        if email not in degrees:
+            report.error(location, email, "Élève inconnu (absent de la table students)")
+            continue
+
+        period = parse_period(record.get("period", ""))
+        if period is None:
+            report.error(location, email, f"Période invalide : {record.get('period')}")
+            continue
+
+        degree = degrees[email]
+        activity = catalogue.find(degree, period, record.get("choice", ""))
+        if activity is None or ("scope" in record and record["scope"] != activity.scope):
+            report.error(location, email, f"{record.get('choice')} (P{period}) n'existe pas pour un élève de D{degree}")
+            continue
+
+        if (email, activity.label, period) in existing:
+            report.skipped += 1
+            continue
+
+        blocked = (9, 10, 910) if period == 910 else (period, 910)
+        taken = periods_taken.setdefault(email, set())
+        if any(p in taken for p in blocked):
+            report.error(location, email, f"Déjà une inscription incompatible avec P{period}")
+            continue
+
+        capacity = activity.manual_capacity
+        registered = sum(used.get((activity.label, period, d), 0) for d in activity.pool_degrees)
+        if capacity is not None and registered >= capacity:
+            report.error(location, email, f"{activity.label} (P{period}) : le groupe est complet")
+            continue
+
+        taken.add(period)
+        used[(activity.label, period, degree)] = used.get((activity.label, period, degree), 0) + 1
+        existing.add((email, activity.label, period))
+        options.append((location, {"email": email, "name": display_name(email), "choice": activity.label,
+                                   "period": period, "degree": degree, "capacity": capacity,
+                                   "pool_degrees": list(activity.pool_degrees)}))
+
+    student_rows = list(students.values())
+    for start in range(0, len(student_rows), CHUNK_SIZE):
+        chunk = student_rows[start:start + CHUNK_SIZE]
+        try:
+            client.table("students").upsert(chunk, on_conflict="email_normalized").execute()
+            report.students += len(chunk)
+        except APIError as error:
+            for student in chunk:
+                report.error("élèves", student["email"], error.message)
+
+    for start in range(0, len(options), CHUNK_SIZE):
+        chunk = options[start:start + CHUNK_SIZE]
+        try:
+            response = client.rpc("reserve_batch", {"p_session": snapshot.session,
+                                                    "p_items": [data for _, data in chunk]}).execute()
+        except APIError as error:
+            for location, data in chunk:
+                report.error(location, data["email"], error.message)
+            continue
+
+        for (location, data), status in zip(chunk, response.data):
+            if status == RESERVED:
+                report.registrations += 1
+            elif status == FULL:
+                report.error(location, data["email"], f"{data['choice']} (P{data['period']}) : le groupe est complet")
+            else:
+                report.error(location, data["email"], f"Déjà une inscription incompatible avec P{data['period']}")
+
+    snapshot.invalidate()
+    return report
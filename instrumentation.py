@@ -0,0 +1,240 @@
+"""
+Mesure des appels à la base et des fonctions principales.
+
+Chaque appel mesuré (requête Supabase ou fonction décorée par `timed`) ajoute
+son nombre d’appels, sa durée et la taille de sa réponse (JSON) :
+- à l’exécution en cours du script (réinitialisée par `start_rerun`),
+- à la session (depuis son ouverture),
+- au processus (toutes sessions confondues).
+
+Export optionnel :
+- journaux structurés (une ligne JSON par appel) avec `enable_logging`,
+- compteurs au format texte Prometheus avec `prometheus_text` / `write_textfile`
+  (à lire par le "textfile collector" de node_exporter).
+"""
+
+
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger("focus_time.metrics")
+
+_current = threading.local()  # mesures de la session dont le script tourne dans ce thread
+
+
+class Stats:
+    """
+        Compteurs par nom d’appel : {nom: [appels, secondes, octets]}.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = {}
+
+    def add(self, name: str, seconds: float, size: int):
+        with self._lock:
+            stats = self.calls.setdefault(name, [0, 0.0, 0])
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] += size
+
+    def rows(self) -> list[dict]:
+        """
+            Compteurs sous forme de lignes (affichage dans un tableau), les plus lents d’abord.
+        """
+
+        with self._lock:
+            calls = sorted(self.calls.items(), key=lambda item: -item[1][1])
+            return [{"appel": name, "nombre": count, "ms": round(seconds * 1000, 1), "octets": size}
+                    for name, (count, seconds, size) in calls]
+
+
+class Recorder:
+    """
+        Mesures d’une session Streamlit.
+
+        Attributes:
+            rerun (Stats): Appels de l’exécution en cours du script.
+            session (Stats): Appels depuis l’ouverture de la session.
+    """
+
+    def __init__(self):
+        self.rerun = Stats()
+        self.session = Stats()
+        self.started_at = time.perf_counter()
+
+
+PROCESS = Stats()
+
+
+def start_rerun(session_state) -> Recorder:
+    """
+        Début d’une exécution du script : remet à zéro les mesures de l’exécution
+        et rattache les appels suivants (dans ce thread) à la session.
+
+        Args:
+            session_state: st.session_state de la session.
+
+        Returns:
+            Recorder: Mesures de la session.
+    """
+
+    if "metrics" not in session_state:
+        session_state["metrics"] = Recorder()
+    recorder = session_state["metrics"]
+    recorder.rerun = Stats()
+    recorder.started_at = time.perf_counter()
+    _current.recorder = recorder
+    return recorder
+
+
+def end_rerun():
+    """
+        Fin d’une exécution du script : enregistre sa durée totale ("rerun").
+    """
+
+    recorder = getattr(_current, "recorder", None)
+    if recorder is not None:
+        record("rerun", time.perf_counter() - recorder.started_at)
+
+
+def record(name: str, seconds: float, size: int = 0):
+    """
+        Enregistre un appel pour l’exécution, la session et le processus.
+    """
+
+    PROCESS.add(name, seconds, size)
+    recorder = getattr(_current, "recorder", None)
+    if recorder is not None:
+        recorder.rerun.add(name, seconds, size)
+        recorder.session.add(name, seconds, size)
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps({"call": name, "ms": round(seconds * 1000, 1), "bytes": size}))
+
+
+def bind(function):
+    """
+        Rattache à la session courante les appels faits par `function` quand elle
+        est exécutée dans un autre thread (pool de lectures parallèles).
+    """
+
+    recorder = getattr(_current, "recorder", None)
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        previous = getattr(_current, "recorder", None)
+        _current.recorder = recorder
+        try:
+            return function(*args, **kwargs)
+        finally:
+            _current.recorder = previous
+    return wrapper
+
+
+def timed(name: str):
+    """
+        Décorateur : mesure la durée de chaque appel de la fonction.
+    """
+
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+class InstrumentedClient:
+    """
+        Enveloppe du client Supabase : chaque `execute()` d’une requête sur une table,
+        une vue ou une fonction (rpc) est mesuré sous le nom de la table ou "rpc/<nom>".
+        Le reste de l’interface est transmis tel quel au client.
+
+        Args:
+            client (Client): Client Supabase.
+    """
+
+    def __init__(self, client):
+        self._client = client
+
+    def table(self, name: str):
+        return _InstrumentedQuery(self._client.table(name), name)
+
+    from_ = table
+
+    def rpc(self, name: str, *args, **kwargs):
+        return _InstrumentedQuery(self._client.rpc(name, *args, **kwargs), "rpc/" + name)
+
+    def __getattr__(self, attribute):
+        return getattr(self._client, attribute)
+
+
+class _InstrumentedQuery:
+    def __init__(self, builder, name: str):
+        self._builder = builder
+        self._name = name
+
+    def execute(self):
+        start = time.perf_counter()
+        response = self._builder.execute()
+        record(self._name, time.perf_counter() - start, len(json.dumps(response.data, default=str)))
+        return response
+
+    def __getattr__(self, attribute):
+        value = getattr(self._builder, attribute)
+        if not callable(value):
+            return value
+
+        def chain(*args, **kwargs):
+            result = value(*args, **kwargs)
+            return _InstrumentedQuery(result, self._name) if hasattr(result, "execute") else result
+        return chain
+
+
+def enable_logging(level: int = logging.INFO):
+    """
+        Active les journaux structurés (une ligne JSON par appel, sur la sortie d’erreur).
+    """
+
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.propagate = False
+    logger.setLevel(level)
+
+
+def prometheus_text() -> str:
+    """
+        Compteurs du processus au format texte Prometheus.
+    """
+
+    lines = ["# TYPE focus_time_calls_total counter",
+             "# TYPE focus_time_call_seconds_total counter",
+             "# TYPE focus_time_call_bytes_total counter"]
+    for row in PROCESS.rows():
+        label = '{call="' + row["appel"].replace("\\", "\\\\").replace('"', '\\"') + '"}'
+        lines.append(f"focus_time_calls_total{label} {row['nombre']}")
+        lines.append(f"focus_time_call_seconds_total{label} {row['ms'] / 1000}")
+        lines.append(f"focus_time_call_bytes_total{label} {row['octets']}")
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(path: str):
+    """
+        Écrit les compteurs dans un fichier (remplacement atomique), pour le
+        textfile collector de node_exporter.
+    """
+
+    temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(temporary, "w", encoding="utf-8") as file:
+        file.write(prometheus_text())
+    os.replace(temporary, path)
@@ -0,0 +1,108 @@
+"""
+Comptages en direct via Supabase Realtime.
+
+Un seul abonnement aux changements de la table `options` est ouvert par processus
+Streamlit, dans un thread dédié (le client Realtime n’existe qu’en asynchrone).
+Chaque notification est transmise aux instantanés suivis (un par session du Focus
+Time, chacun ignore les lignes des autres sessions) ; les sessions ouvertes
+relisent ces comptages en mémoire, sans requête vers la base.
+
+Si l’abonnement tombe, l’instantané repasse en mode TTL court (relecture de la
+vue `option_counts`) jusqu’à la reconnexion.
+"""
+
+
+import asyncio
+import logging
+import threading
+
+from realtime import AsyncRealtimeClient, RealtimeSubscribeStates
+
+from registrations import RegistrationSnapshot
+
+RECONNECT_DELAY = 10  # secondes avant une nouvelle tentative de connexion
+HEALTH_CHECK = 5  # secondes entre deux vérifications de la connexion
+
+logger = logging.getLogger(__name__)
+
+
+class LiveCounts:
+    """
+        Abonnement Realtime unique qui tient à jour les comptages des instantanés suivis.
+
+        Args:
+            url (str): URL du projet Supabase.
+            key (str): Clé Supabase.
+    """
+
+    def __init__(self, url: str, key: str):
+        self._url = url.rstrip("/") + "/realtime/v1"
+        self._key = key
+        self._snapshots = {}
+        self._live = False
+        self._thread = None
+
+    def watch(self, snapshot: RegistrationSnapshot) -> "LiveCounts":
+        """
+            Ajoute un instantané à tenir à jour (sans effet s’il est déjà suivi).
+        """
+
+        if self._snapshots.get(snapshot.session) is not snapshot:
+            snapshot.live = self._live
+            self._snapshots = {**self._snapshots, snapshot.session: snapshot}
+        return self
+
+    def start(self) -> "LiveCounts":
+        """
+            Démarre le thread d’écoute (sans effet s’il tourne déjà).
+        """
+
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="focus-time-realtime", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        asyncio.run(self._listen())
+
+    async def _listen(self):
+        while True:
+            client = AsyncRealtimeClient(self._url, token=self._key, auto_reconnect=True)
+            try:
+                channel = client.channel("options-counts")
+                channel.on_postgres_changes("*", table="options", schema="public", callback=self._on_change)
+                await channel.subscribe(self._on_subscribe)
+
+                while client.is_connected:
+                    await asyncio.sleep(HEALTH_CHECK)
+            except Exception:
+                logger.exception("Abonnement Realtime interrompu")
+            finally:
+                self._set_live(False)
+                try:
+                    await client.close()
+                except Exception:
+                    pass
+
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    def _on_subscribe(self, status: RealtimeSubscribeStates, error: Exception | None):
+        if status == RealtimeSubscribeStates.SUBSCRIBED:
+            # Des changements ont pu être manqués avant (ou pendant une coupure) :
+            # une relecture de la vue resynchronise les comptages.
+            for snapshot in self._snapshots.values():
+                snapshot.invalidate()
+            self._set_live(True)
+        else:
+            logger.warning("Abonnement Realtime : %s %s", status, error or "")
+            self._set_live(False)
+
+    def _set_live(self, live: bool):
+        self._live = live
+        for snapshot in self._snapshots.values():
+            snapshot.live = live
+
+    def _on_change(self, payload: dict):
+        data = payload.get("data", {})
+        for snapshot in self._snapshots.values():
+            snapshot.apply_change(data.get("type"), data.get("record"), data.get("old_record"))
@@ -0,0 +1,338 @@
+"""
+Cache local (SQLite) pour continuer à servir les pages quand Supabase ne répond pas.
+
+Optionnel (LOCAL_CACHE dans main.py), un fichier par serveur :
+- miroir des degrés des élèves déjà connectés et des comptages d’inscriptions
+  par session (recopiés par le thread d’écriture à chaque changement), relus
+  quand la base est injoignable ou au redémarrage de l’application,
+- inscriptions différées : si une réservation ne peut pas être envoyée, elle est
+  acceptée localement, dans la limite des places connues (comptages de
+  l’instantané + inscriptions en attente), et mise en file d’attente,
+- écriture différée : un thread envoie les inscriptions en attente par lots
+  (fonction Postgres `reserve_batch`, une seule requête par lot). La base garde le
+  dernier mot : une inscription refusée (groupe complet entre-temps) est marquée
+  comme telle et l’élève est invité à choisir une autre activité.
+
+Réconciliation : si la réponse d’un lot a été perdue, le lot est renvoyé et ses
+inscriptions déjà enregistrées reviennent en "already_registered" ; elles sont
+alors comparées aux lignes de la table `options` et marquées comme confirmées.
+
+Une inscription confirmée reste affichée depuis le cache pendant CONFIRMED_KEEP
+secondes (le temps que la page relise la base), puis est supprimée du cache ; les
+inscriptions refusées sont supprimées avec leur session.
+
+Le catalogue des activités est déjà lu depuis des fichiers locaux (catalogue.py).
+"""
+
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from supabase import Client
+
+from database import DatabaseUnavailable
+from registrations import RESERVED, FULL, ALREADY_REGISTERED, RegistrationSnapshot
+
+FLUSH_INTERVAL = 5  # secondes entre deux envois des inscriptions en attente
+FLUSH_BATCH = 200  # inscriptions par lot
+CONFIRMED_KEEP = 120  # secondes pendant lesquelles une inscription confirmée reste dans le cache
+
+# Statut d’une inscription différée
+PENDING = "pending"
+CONFIRMED = "confirmed"
+REJECTED = "rejected"
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+create table if not exists students (
+    email text primary key,
+    degree integer not null,
+    updated_at real not null
+);
+create table if not exists counts (
+    session text not null,
+    choice text not null,
+    period integer not null,
+    degree integer not null,
+    registered integer not null,
+    primary key (session, choice, period, degree)
+);
+create table if not exists pending (
+    id integer primary key autoincrement,
+    session text not null,
+    email text not null,
+    name text not null,
+    choice text not null,
+    period integer not null,
+    degree integer not null,
+    capacity integer,
+    pool_degrees text,
+    status text not null default 'pending',
+    result text,
+    created_at real not null,
+    updated_at real
+);
+create index if not exists pending_status_idx on pending (status, id);
+create index if not exists pending_email_idx on pending (session, email);
+"""
+
+
+class LocalCache:
+    """
+        Cache SQLite partagé par toutes les sessions du processus, avec son thread
+        d’écriture différée.
+
+        Args:
+            path (str): Fichier SQLite (créé au besoin).
+    """
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("pragma journal_mode=wal")
+        self._db.executescript(SCHEMA)
+
+        self._snapshots = {}
+        self._mirrored = {}
+        self._thread = None
+
+        # Inscriptions en attente par (session, activité, période, degré), gardées en mémoire
+        # pour le calcul des places restantes à chaque affichage.
+        self._pending = {}
+        for session, choice, period, degree, count in self._db.execute(
+                "select session, choice, period, degree, count(*) from pending where status = ? "
+                "group by session, choice, period, degree", (PENDING,)):
+            self._pending[(session, choice, period, degree)] = count
+
+    def watch(self, snapshot: RegistrationSnapshot) -> "LocalCache":
+        """
+            Ajoute un instantané dont les comptages sont recopiés dans le cache (sans
+            effet s’il est déjà suivi). Un instantané qui n’a encore rien lu de la base
+            reprend les derniers comptages recopiés.
+        """
+
+        if self._snapshots.get(snapshot.session) is not snapshot:
+            snapshot.restore(self.counts(snapshot.session))
+            self._snapshots = {**self._snapshots, snapshot.session: snapshot}
+        return self
+
+    def start(self, client: Client) -> "LocalCache":
+        """
+            Démarre le thread d’écriture différée (sans effet s’il tourne déjà).
+        """
+
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, args=(client,), name="focus-time-write-behind",
+                                            daemon=True)
+            self._thread.start()
+        return self
+
+    # region Lectures
+    def student_degree(self, email: str) -> int | None:
+        """
+            Dernier degré connu d’un utilisateur, None s’il n’est pas dans le cache.
+        """
+
+        with self._lock:
+            row = self._db.execute("select degree from students where email = ?", (email.lower(),)).fetchone()
+        return row[0] if row else None
+
+    def store_student(self, email: str, degree: int):
+        with self._lock:
+            self._db.execute("insert into students (email, degree, updated_at) values (?, ?, ?) "
+                             "on conflict (email) do update set degree = excluded.degree, "
+                             "updated_at = excluded.updated_at",
+                             (email.lower(), degree, time.time()))
+
+    def counts(self, session: str) -> dict[tuple[str, int, int], int]:
+        """
+            Derniers comptages recopiés pour une session (vides si aucun).
+        """
+
+        with self._lock:
+            rows = self._db.execute("select choice, period, degree, registered from counts where session = ?",
+                                    (session,)).fetchall()
+        return {(choice, period, degree): registered for choice, period, degree, registered in rows}
+
+    def store_counts(self, session: str, counts: dict):
+        with self._lock:
+            self._db.execute("begin")
+            self._db.execute("delete from counts where session = ?", (session,))
+            self._db.executemany("insert into counts (session, choice, period, degree, registered) "
+                                 "values (?, ?, ?, ?, ?)",
+                                 [(session, choice, period, degree, registered)
+                                  for (choice, period, degree), registered in counts.items()])
+            self._db.execute("commit")
+
+    def pending_count(self, session: str, choice: str, period: int, degree: int) -> int:
+        """
+            Inscriptions en attente d’envoi pour une activité, une période et un degré.
+        """
+
+        return self._pending.get((session, choice, period, degree), 0)
+
+    def registrations(self, session: str, email: str) -> list[dict]:
+        """
+            Inscriptions différées d’un élève {"choice", "period", "status", "result"} :
+            en attente, refusées, et confirmées depuis moins de CONFIRMED_KEEP secondes.
+        """
+
+        with self._lock:
+            rows = self._db.execute("select choice, period, status, result from pending "
+                                    "where session = ? and email = ? and (status != ? or updated_at >= ?) "
+                                    "order by id",
+                                    (session, email.lower(), CONFIRMED, time.time() - CONFIRMED_KEEP)).fetchall()
+        return [{"choice": choice, "period": period, "status": status, "result": result}
+                for choice, period, status, result in rows]
+    # endregion
+
+    # region Écritures
+    def reserve(self, session: str, email: str, name: str, choice: str, period: int, degree: int,
+                capacity: int | None, pool_degrees: list[int], registered: int, taken: list[int]) -> str:
+        """
+            Accepte une inscription en attente, mêmes règles que `reserve_option` mais
+            sur les données locales : aucune inscription confirmée (`taken`) ni en
+            attente de l’élève sur une période incompatible, places restantes selon
+            `registered` (inscrits connus de l’instantané) et les inscriptions en attente.
+
+            Args:
+                registered (int): Inscrits connus pour l’activité (degrés du groupe).
+                taken (list[int]): Périodes des inscriptions confirmées de l’élève.
+                Autres arguments : voir `RegistrationSnapshot.reserve`.
+
+            Returns:
+                str: RESERVED, FULL ou ALREADY_REGISTERED.
+        """
+
+        email = email.lower()
+        blocked = (9, 10, 910) if period == 910 else (period, 910)
+        if any(taken_period in blocked for taken_period in taken):
+            return ALREADY_REGISTERED
+        with self._lock:
+            conflict = self._db.execute(
+                "select 1 from pending where session = ? and email = ? and status = ? "
+                f"and period in ({', '.join('?' * len(blocked))})",
+                (session, email, PENDING, *blocked)).fetchone()
+            if conflict:
+                return ALREADY_REGISTERED
+
+            waiting = sum(self._pending.get((session, choice, period, pool_degree), 0)
+                          for pool_degree in pool_degrees)
+            if capacity is not None and registered + waiting >= capacity:
+                return FULL
+
+            self._db.execute("insert into pending (session, email, name, choice, period, degree, capacity, "
+                             "pool_degrees, created_at) values (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                             (session, email, name, choice, period, degree, capacity, json.dumps(pool_degrees),
+                              time.time()))
+            key = (session, choice, period, degree)
+            self._pending = {**self._pending, key: self._pending.get(key, 0) + 1}
+        return RESERVED
+
+    def flush(self, client: Client) -> set[str]:
+        """
+            Envoie un lot d’inscriptions en attente (une requête par session) et
+            enregistre le verdict de la base pour chacune.
+
+            Returns:
+                set[str]: Sessions dont des inscriptions ont été envoyées.
+
+            Raises:
+                DatabaseUnavailable: Si la base ne répond pas (le lot sera renvoyé).
+        """
+
+        with self._lock:
+            rows = self._db.execute("select id, session, email, name, choice, period, degree, capacity, pool_degrees "
+                                    "from pending where status = ? order by id limit ?",
+                                    (PENDING, FLUSH_BATCH)).fetchall()
+
+        batches = {}
+        for row in rows:
+            batches.setdefault(row[1], []).append(row)
+
+        for session, batch in batches.items():
+            response = client.rpc("reserve_batch", {"p_session": session, "p_items": [
+                {"email": email, "name": name, "choice": choice, "period": period, "degree": degree,
+                 "capacity": capacity, "pool_degrees": json.loads(pool_degrees) if pool_degrees else None}
+                for _, _, email, name, choice, period, degree, capacity, pool_degrees in batch
+            ]}).execute()
+            results = response.data
+
+            # Réponse perdue au premier envoi ? Les lignes déjà présentes sont confirmées.
+            conflicts = {row[2] for row, result in zip(batch, results) if result == ALREADY_REGISTERED}
+            existing = set()
+            if conflicts:
+                response = (client.table("options").select("email, choice, period").eq("session", session)
+                            .in_("email_normalized", sorted(conflicts)).execute())
+                existing = {(data["email"].lower(), data["choice"], int(data["period"])) for data in response.data}
+
+            self._record(session, batch, results, existing)
+
+        return set(batches)
+
+    def _record(self, session: str, batch: list, results: list, existing: set):
+        updates = []
+        now = time.time()
+        for row, result in zip(batch, results):
+            row_id, _, email, _, choice, period = row[:6]
+            status = CONFIRMED if result == RESERVED or (email, choice, period) in existing else REJECTED
+            updates.append((status, result, now, row_id))
+
+        with self._lock:
+            pending = dict(self._pending)
+            for row in batch:
+                key = (session, row[4], row[5], row[6])
+                pending[key] = max(pending.get(key, 0) - 1, 0)
+
+            self._db.execute("begin")
+            self._db.executemany("update pending set status = ?, result = ?, updated_at = ? where id = ?", updates)
+            self._db.execute("commit")
+            self._pending = pending
+        rejected = sum(1 for status, _, _, _ in updates if status == REJECTED)
+        if rejected:
+            logger.warning("Écriture différée : %s inscription(s) refusée(s) par la base", rejected)
+    def purge(self):
+        """
+            Supprime les inscriptions confirmées depuis plus de CONFIRMED_KEEP secondes
+            (elles sont dans la base) et les inscriptions traitées des sessions
+            antérieures aux sessions suivies.
+        """
+
+        sessions = list(self._snapshots)
+        with self._lock:
+            self._db.execute("delete from pending where status = ? and updated_at < ?",
+                             (CONFIRMED, time.time() - CONFIRMED_KEEP))
+            if sessions:
+                self._db.execute("delete from pending where status != ? and session < ?", (PENDING, min(sessions)))
+    # endregion
+
+    def _run(self, client: Client):
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            sessions = set()
+            if any(self._pending.values()):
+                try:
+                    sessions = self.flush(client)
+                except DatabaseUnavailable:
+                    logger.info("Écriture différée : base injoignable, nouvel essai dans %s s", FLUSH_INTERVAL)
+                except Exception:
+                    logger.exception("Écriture différée impossible")
+
+            try:
+                self.purge()
+            except sqlite3.Error:
+                logger.exception("Cache local : inscriptions traitées non supprimées")
+
+            for snapshot in self._snapshots.values():
+                if snapshot.session in sessions:
+                    snapshot.invalidate()
+                if self._mirrored.get(snapshot.session) != snapshot.version and snapshot.counts:
+                    self._mirrored[snapshot.session] = snapshot.version
+                    try:
+                        self.store_counts(snapshot.session, snapshot.counts)
+                    except sqlite3.Error:
+                        logger.exception("Cache local : comptages non enregistrés")
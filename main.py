@@ -10,218 +10,550 @@ Cette application permet :
 Le comportement de l’application dépend :
 - du rôle de l’utilisateur (élève ou professeur),
 - de la période d’inscription ouverte,
-- du mode ATELIER_MODE (True = Inscriptions pour des ateliers, False = Inscriptions pour des remédiations).
+- du mode ATELIER_MODE (True = Inscriptions pour des ateliers, False = Inscriptions pour des remédiations),
+- du mode PREFERENCE_MODE (True = les élèves classent leurs choix et les places sont réparties
+  à la fermeture, False = premier arrivé, premier servi).
 
 Données externes :
 (Permet de définir le nom des options et le nombre place maximum).
 - options.json : activités P9 et P10
 - options_p910.json : activités qui durent deux périodes
 - registration_open.json : fenêtre temporelle d’inscription
+- supabase/migrations : vues et fonctions Postgres utilisées par l’application
 """
 
 
 import streamlit as st
-import json
-import httpx
-import string
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 from openpyxl import Workbook
-from supabase import create_client, Client
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.utils import get_column_letter
 from datetime import datetime
 from openpyxl.styles import PatternFill, Alignment, Font
-
-TIMEZONE = 2  # GMT+2
-DEGREE_PROF = 4
+from registrations import DEGREE_PROF, RegistrationSnapshot, RESERVED, FULL, ALREADY_REGISTERED, display_name
+from catalogue import Activity, Catalogue, load_catalogue, catalogue_files, catalogue_key
+from importer import import_file
+from allocation import MAX_PREFERENCES, allocate, fetch_preferences, load_preferences, save_preferences, write_allocation
+from live_counts import LiveCounts
+from local_cache import LocalCache, PENDING, REJECTED
+from admission import AdmissionQueue
+from registration_window import TIMEZONE, RegistrationWindow, load_window
+from database import DatabaseUnavailable, connect
+from instrumentation import InstrumentedClient, PROCESS, Recorder, bind, timed, start_rerun, end_rerun, enable_logging, write_textfile
 
 ATELIER_MODE = False
+PREFERENCE_MODE = False  # Choix classés par les élèves, répartis à la fermeture (allocation.py)
+
+LIVE_COUNTS = True  # Comptages poussés par Supabase Realtime (un abonnement par processus)
+LIVE_REFRESH = 3  # secondes entre deux rafraîchissements des formulaires d’inscription
+WINDOW_CHECK_MAX = 900  # secondes maximum entre deux vérifications de la page d’attente
+OWN_REGISTRATIONS_TTL = 60  # secondes avant de relire les inscriptions de l’élève connecté
+STUDENT_SEARCH_MIN = 2  # caractères avant de lancer une recherche d’élève
+STUDENT_SEARCH_LIMIT = 20  # élèves par page de résultats
+GROUPS_PER_PAGE = 6  # activités par page dans la vue des groupes
+ADMISSION_QUEUE = False  # File d’attente à l’ouverture des inscriptions
+ADMISSION_RATE = 5  # sessions admises par seconde
+ADMISSION_BURST = 50  # sessions admises immédiatement à l’ouverture
+METRICS_LOG = False  # Une ligne JSON par appel mesuré dans les journaux
+METRICS_TEXTFILE = None  # Fichier de compteurs Prometheus, ex. "/var/lib/node_exporter/focus_time.prom"
+LOCAL_CACHE = None  # Cache SQLite si la base ne répond pas, ex. "focus_time_cache.sqlite3" (None = désactivé)
+
+DB_ERROR = "La base de données ne répond pas, réessaie dans un instant"
+DB_STALE = "Connexion à la base perturbée : les informations affichées peuvent ne pas être à jour"
 
 
 @st.cache_resource
-def init_db_connection() -> Client:
+def init_db_connection() -> InstrumentedClient:
     """
-        Initialise et met en cache la connexion à la base de données Supabase.
+        Initialise et met en cache la connexion à la base de données Supabase
+        (client httpx partagé, nouvelles tentatives et disjoncteur, voir database.py).
 
         Les identifiants sont récupérés depuis les secrets Streamlit :
         - SUPABASE_URL
         - SUPABASE_KEY
 
         Returns:
-            Client: Client Supabase prêt à être utilisé pour les requêtes
-                    (tables students, options, etc.).
+            InstrumentedClient: Client Supabase prêt à être utilisé pour les requêtes
+                                (tables students, options, etc.), dont chaque appel est mesuré.
     """
 
     url = st.secrets["SUPABASE_URL"]
     key = st.secrets["SUPABASE_KEY"]
 
-    client = create_client(url, key)
+    client = connect(url, key)
     # user = client.auth.sign_in_with_password({"email": st.secrets["USER_EMAIL"], "password": st.secrets["USER_PASS"]})
 
-    return client
+    return InstrumentedClient(client)
 
 
-@st.dialog("Inscrire un élève", width="medium")
-def select_student():
+@st.cache_resource(max_entries=4)
+def get_registration_snapshot(session: str) -> RegistrationSnapshot:
     """
-        Interface professeur pour inscrire manuellement un élève.
+        Crée et met en cache l’instantané des inscriptions d’une session du Focus Time,
+        partagé par toutes les sessions Streamlit.
 
-        - récupère la liste des élèves depuis la table `students`,
-        - vérifie si l’élève est déjà inscrit en P9, P10 ou P910,
-        - empêche les doubles inscriptions et les groupes complets,
-        - insère les nouvelles inscriptions dans la table `options`.
+        L’instantané se rafraîchit lui-même (TTL court, téléchargement incrémental)
+        et doit être invalidé après chaque insertion dans la table `options`.
+
+        Args:
+            session (str): Session du Focus Time (date ISO).
+
+        Returns:
+            RegistrationSnapshot: Instantané commun des inscriptions de la session.
     """
 
+    return RegistrationSnapshot(init_db_connection(), session)
+
+
+@st.cache_resource
+def start_live_counts() -> LiveCounts:
+    """
+        Démarre l’abonnement Realtime unique du processus, qui met à jour
+        les comptages des instantanés des inscriptions (voir LiveCounts.watch).
+
+        Returns:
+            LiveCounts: Abonnement en cours.
+    """
+
+    return LiveCounts(st.secrets["SUPABASE_URL"], st.secrets["SUPABASE_KEY"]).start()
+
+
+@st.cache_resource
+def start_local_cache() -> LocalCache:
+    """
+        Ouvre le cache local du processus et démarre son thread d’écriture différée
+        (voir local_cache.py).
+
+        Returns:
+            LocalCache: Cache local.
+    """
+
+    return LocalCache(LOCAL_CACHE).start(init_db_connection())
+
+
+def load_concurrently(**calls) -> tuple[dict, dict]:
+    """
+        Lance des lectures indépendantes en parallèle : la durée totale est celle
+        de la plus lente, et non la somme de toutes.
+
+        La première lecture est faite dans le thread du script, les autres dans
+        des threads propres à cet appel (un par lecture) : les sessions ne
+        s’attendent pas les unes les autres. Les fonctions ne doivent pas utiliser
+        Streamlit (st.session_state, affichage...).
+
+        Args:
+            **calls: Fonctions sans argument, par nom.
+
+        Returns:
+            tuple[dict, dict]: Résultats par nom, et erreurs (DatabaseUnavailable)
+                               par nom pour les lectures qui ont échoué.
+    """
+
+    (first, first_call), *others = calls.items()
+    results = {}
+    errors = {}
+
+    pool = ThreadPoolExecutor(max_workers=len(others), thread_name_prefix="focus-time-load") if others else None
     try:
-        response_email = client.table("students").select("*").execute()
-    except httpx.ReadError:
-        st.rerun()
+        futures = {name: pool.submit(bind(call)) for name, call in others}
+        try:
+            results[first] = first_call()
+        except DatabaseUnavailable as error:
+            errors[first] = error
+        for name, future in futures.items():
+            try:
+                results[name] = future.result()
+            except DatabaseUnavailable as error:
+                errors[name] = error
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=False)
+    return results, errors
+
+
+@st.cache_resource
+def get_admission_queue() -> AdmissionQueue:
+    """
+        File d’attente partagée par toutes les sessions du processus.
+
+        Returns:
+            AdmissionQueue: File d’attente.
+    """
+
+    return AdmissionQueue(ADMISSION_RATE, ADMISSION_BURST)
+
+
+@st.cache_resource(max_entries=2)
+def get_catalogue(files: tuple[str, str], key: tuple) -> Catalogue:
+    """
+        Charge et met en cache le catalogue des activités d’une session
+        (options.json, options_p910.json, voir catalogue_files).
+
+        Args:
+            files (tuple[str, str]): Fichiers du catalogue.
+            key (tuple): Dates de modification des fichiers : le catalogue est relu
+                         uniquement quand un fichier change.
+
+        Returns:
+            Catalogue: Activités indexées par identifiant et par (degré, période).
+    """
+
+    return load_catalogue(*files)
+
+
+@st.cache_resource(max_entries=1)
+def load_registration_window(mtime: float) -> RegistrationWindow:
+    """
+        Lit registration_open.json et calcule les instants d’ouverture et de fermeture
+        (une fois par processus, à nouveau seulement quand le fichier change).
+
+        Args:
+            mtime (float): Date de modification du fichier (clé du cache).
+
+        Returns:
+            RegistrationWindow: Fenêtre d’inscription.
+    """
+
+    return load_window("registration_open.json", TIMEZONE)
+
+
+def get_place_left(activity: Activity) -> int:
+    """
+        Nombre de places restantes pour une activité (places partagées D2_D3 comprises,
+        inscriptions en attente dans le cache local comprises).
+    """
+
+    registered = get_registered_count(activity)
+    if local_cache is not None:
+        registered += sum(local_cache.pending_count(session, activity.label, activity.period, degree)
+                          for degree in activity.pool_degrees)
+    return activity.capacity - registered
+
+
+def get_registered_count(activity: Activity) -> int:
+    """
+        Nombre d’inscrits connus de l’instantané pour une activité (degrés du groupe).
+    """
+
+    return sum(registrations.count(activity.label, activity.period, degree) for degree in activity.pool_degrees)
 
-    all_emails = []
-    for email in response_email.data:
-        all_emails.append(email["email"].lower())
+
+@st.cache_data(ttl=60, max_entries=256)
+def search_students(prefix: str, page: int) -> tuple[list[str], bool]:
+    """
+        Recherche des élèves par début d’adresse email, côté base de données.
+
+        Seule la colonne `email` d’une page de résultats est téléchargée (colonne
+        `email_normalized` indexée, voir supabase/migrations). Les recherches
+        récentes sont gardées en cache une minute, pour tous les professeurs.
+
+        Args:
+            prefix (str): Début de l’adresse email (minuscules, caractères d’email uniquement).
+            page (int): Numéro de la page de résultats (0 = première).
+
+        Returns:
+            tuple[list[str], bool]: Emails de la page (minuscules, triés) et True s’il
+                                    y a d’autres résultats après cette page.
+    """
+
+    pattern = prefix.replace("_", "\\_") + "%"
+    start = page * STUDENT_SEARCH_LIMIT
+    response = (client.table("students").select("email")
+                .like("email_normalized", pattern)
+                .order("email_normalized")
+                .range(start, start + STUDENT_SEARCH_LIMIT)  # une ligne de plus : page suivante ?
+                .execute())
+
+    emails = [student["email"].lower() for student in response.data]
+    return emails[:STUDENT_SEARCH_LIMIT], len(emails) > STUDENT_SEARCH_LIMIT
+
+
+def pick_student() -> str | None:
+    """
+        Sélecteur d’élève paginé : un champ de recherche (la requête part quand la
+        saisie est validée, à partir de STUDENT_SEARCH_MIN caractères) puis la liste
+        des élèves correspondants, page par page.
+
+        Returns:
+            str | None: Email de l’élève choisi (minuscules), ou None.
+    """
+
+    query = st.text_input("Rechercher un élève", placeholder="Début de l'adresse email (prenom.nom)")
+    prefix = "".join(c for c in query.strip().lower() if c.isalnum() or c in ".@_-")
+    if len(prefix) < STUDENT_SEARCH_MIN:
+        st.caption(f"Tape au moins {STUDENT_SEARCH_MIN} caractères puis Entrée")
+        return None
+
+    if st.session_state.get("student_search") != prefix:
+        st.session_state["student_search"] = prefix
+        st.session_state["student_search_page"] = 0
+    page = st.session_state["student_search_page"]
+
+    try:
+        emails, has_more = search_students(prefix, page)
+    except DatabaseUnavailable:
+        st.error(DB_ERROR)
+        return None
+
+    if len(emails) == 0:
+        st.info("Aucun élève trouvé")
+        return None
 
     email = st.selectbox(
         "Adresse email de l'élève",
-        all_emails,
+        emails,
         index=None,
         placeholder="Choisir un email"
     )
 
+    if page > 0 or has_more:
+        col1, col2, col3 = st.columns([1, 2, 1])
+        with col1:
+            if st.button("Précédents", disabled=page == 0, width="stretch"):
+                st.session_state["student_search_page"] -= 1
+                st.rerun(scope="fragment")
+        with col2:
+            st.caption(f"Page {page + 1}")
+        with col3:
+            if st.button("Suivants", disabled=not has_more, width="stretch"):
+                st.session_state["student_search_page"] += 1
+                st.rerun(scope="fragment")
+
+    return email
+
+
+@st.dialog("Inscrire un élève", width="medium")
+def select_student():
+    """
+        Interface professeur pour inscrire manuellement un élève.
+
+        - recherche l’élève dans la table `students` (voir `pick_student`),
+        - vérifie si l’élève est déjà inscrit en P9, P10 ou P910,
+        - empêche les doubles inscriptions et les groupes complets,
+        - enregistre toutes les nouvelles inscriptions en une seule transaction (`reserve_options`).
+    """
+
+    email = pick_student()
+
     enroll_p9 = False
     enroll_p10 = False
     if email is not None:
-        for enroll in response_options.data:
-            if enroll["email"].lower() == email.lower():
-                if int(enroll['period']) == 9:
-                    enroll_p9 = True
-                elif int(enroll['period']) == 10:
-                    enroll_p10 = True
-                elif int(enroll['period']) == 910:
-                    enroll_p9 = True
-                    enroll_p10 = True
-                st.success(f"{enroll['name']} est déjà inscrit en {enroll['choice']} (P{enroll['period']})")
-
-    opts_list = []
-    for degree, option_names in options_list.items():
-        for name in option_names.keys():
-            opts_list.append(f"{name} ({degree})")
-
-    opts_list_p910 = []
-    for degree, option_names in options_p910_list.items():
-        for name in option_names.keys():
-            opts_list_p910.append(f"{name} ({degree})")
-
-    option_p9 = st.selectbox(
-        "Remédiation/Atelier P9",
-        opts_list,
-        index=None,
-        placeholder="Choisir une remédiation/atelier"
-    )
+        try:
+            enrolments = fetch_registered_options(email)
+        except DatabaseUnavailable:
+            st.error(DB_ERROR)
+            return
+
+        for enroll in enrolments:
+            if int(enroll['period']) == 9:
+                enroll_p9 = True
+            elif int(enroll['period']) == 10:
+                enroll_p10 = True
+            elif int(enroll['period']) == 910:
+                enroll_p9 = True
+                enroll_p10 = True
+            st.success(f"{enroll['name']} est déjà inscrit en {enroll['choice']} (P{enroll['period']})")
 
     no_place_left = False
-    if option_p9 is not None:
-        option = " ".join(option_p9.split()[:-1]) + f" P9 D{option_p9.split()[-1][2]}"
-
-        place_total = options_list[f"D{option_p9.split()[-1][2]}"][" ".join(option_p9.split()[:-1])]
-
-        if option in already_registered:
-            place_left = place_total - already_registered[option]
-            if place_left > 0:
-                st.info(f"{already_registered[option]} élèves déjà inscrits en {option_p9} (P9)")
+    options = {}
+    for period, label, checked_periods in ((9, "P9", "P9"), (10, "P10", "P10"), (910, "P9 et P10", "P9 ou P10")):
+        activity_id = st.selectbox(
+            f"Remédiation/Atelier {label}",
+            [activity.id for activity in catalogue.for_period(period)],
+            index=None,
+            format_func=lambda activity_id: f"{catalogue.by_id[activity_id].label} ({catalogue.by_id[activity_id].scope})",
+            placeholder="Choisir une remédiation/atelier"
+        )
+        if activity_id is None:
+            options[period] = None
+            continue
+        activity = options[period] = catalogue.by_id[activity_id]
+
+        place_left = get_place_left(activity)
+        registered = activity.capacity - place_left
+        if registered > 0:
+            if place_left > 0 or activity.manual_capacity is None:
+                st.info(f"{registered} élèves déjà inscrits en {activity.label} ({activity.scope}) ({label})")
             else:
                 no_place_left = True
                 st.error("Le groupe est complet")
 
-        if enroll_p9:
+        if (period == 9 and enroll_p9) or (period == 10 and enroll_p10) or (period == 910 and (enroll_p9 or enroll_p10)):
             no_place_left = True
-            st.error("Cet élève a déjà une inscription en P9")
+            st.error(f"Cet élève a déjà une inscription en {checked_periods}")
 
-    option_p10 = st.selectbox(
-        "Remédiation/Atelier P10",
-        opts_list,
-        index=None,
-        placeholder="Choisir une remédiation/atelier"
-    )
+    st.divider()
+    if st.button("Valider", disabled=no_place_left):
+        if email is not None:
+            name = display_name(email)
+
+            reservations = []
+            for activity in options.values():
+                if activity is None:
+                    continue
+                reservations.append({
+                    "choice": activity.label,
+                    "period": activity.period,
+                    "degree": activity.degree,
+                    "capacity": activity.manual_capacity,
+                    "pool_degrees": list(activity.pool_degrees)
+                })
+
+            if len(reservations) > 0:
+                try:
+                    result = registrations.reserve_many(email, name, reservations)
+                except DatabaseUnavailable:
+                    st.error(DB_ERROR)
+                    return
+
+                if result["status"] == RESERVED:
+                    st.rerun()
+                elif result["status"] == FULL:
+                    st.error(f"{result['choice']} (P{result['period']}) : le groupe est complet, "
+                             f"aucune inscription n'a été enregistrée")
+                else:
+                    st.error(f"{result['choice']} (P{result['period']}) : cet élève a déjà une inscription "
+                             f"sur cette période, aucune inscription n'a été enregistrée")
 
-    if option_p10 is not None:
-        option = " ".join(option_p10.split()[:-1]) + f" P10 D{option_p10.split()[-1][2]}"
 
-        place_total = options_list[f"D{option_p10.split()[-1][2]}"][" ".join(option_p10.split()[:-1])]
+@st.dialog("Importer des élèves ou des inscriptions", width="large")
+def import_registrations():
+    """
+        Interface professeur pour importer en masse des élèves et/ou des inscriptions.
 
-        if option in already_registered:
-            place_left = place_total - already_registered[option]
-            if place_left > 0:
-                st.info(f"{already_registered[option]} élèves déjà inscrits en {option_p10} (P10)")
-            else:
-                no_place_left = True
-                st.error("Le groupe est complet")
+        Accepte un fichier CSV ou XLSX (liste d’élèves, liste d’inscriptions ou
+        fichier au format de l’export Excel). Chaque ligne est validée avant
+        l’envoi par lots ; les lignes refusées sont affichées avec leur motif.
+    """
 
-        if enroll_p10:
-            no_place_left = True
-            st.error("Cet élève a déjà une inscription en P10")
+    st.caption("Colonnes attendues : email, degree (élèves) ou email, choice, period (inscriptions). "
+               "Un fichier exporté depuis « Voir les groupes » est aussi accepté.")
+    uploaded = st.file_uploader("Fichier CSV ou Excel", type=["csv", "xlsx"])
 
-    option_p910 = st.selectbox(
-        "Remédiation/Atelier P9 et P10",
-        opts_list_p910,
-        index=None,
-        placeholder="Choisir une remédiation/atelier"
-    )
+    if st.button("Importer", type="primary", disabled=uploaded is None):
+        try:
+            with st.spinner("Import en cours..."):
+                report = import_file(client, registrations, catalogue, uploaded, uploaded.name)
+        except DatabaseUnavailable:
+            st.error(DB_ERROR)
+            return
 
-    if option_p910 is not None:
-        option = " ".join(option_p910.split()[:-1]) + f" P910 D{option_p910.split()[-1][2]}"
-        place_total = options_p910_list[f"{option_p910.split()[-1][1:-1]}"][" ".join(option_p910.split()[:-1])]
+        st.success(f"{report.students} élèves et {report.registrations} inscriptions importés "
+                   f"({report.skipped} inscriptions déjà présentes)")
+        if len(report.errors) > 0:
+            st.error(f"{len(report.errors)} lignes refusées")
+            st.dataframe(report.errors, width="stretch", hide_index=True)
 
-        if option in already_registered:
-            place_left = place_total - already_registered[option]
-            if place_total == 0 or place_left > 0:
-                st.info(f"{already_registered[option]} élèves déjà inscrits en {option_p910} (P9 et P10)")
-            else:
-                no_place_left = True
-                st.error("Le groupe est complet")
 
-        if enroll_p9 or enroll_p10:
-            no_place_left = True
-            st.error("Cet élève a déjà une inscription en P9 ou P10")
+@st.dialog("Répartir les préférences", width="large")
+def allocate_preferences():
+    """
+        Interface professeur du mode préférences : calcule la répartition des élèves
+        selon leurs choix (places restantes, degrés et périodes respectés), l’affiche,
+        puis l’enregistre en une seule requête. La base revérifie chaque inscription :
+        celles qu’elle refuse (groupe complet ou période déjà prise entre-temps) sont listées.
 
-    st.divider()
-    if st.button("Valider", disabled=no_place_left):
-        if email is not None:
-            name = email.split("@")[0].split(".")
-            if len(name) > 1:
-                name = name[0].capitalize() + " " + name[1].capitalize()
-            else:
-                name = name[0].capitalize()
-            if option_p9 is not None:
-                data = {
-                    "email": email,
-                    "name": name,
-                    "choice": " ".join(option_p9.split()[:-1]),
-                    "period": 9,
-                    "degree": int(option_p9.split()[-1][2])
-                }
-                client.table("options").insert(data).execute()
-            if option_p10 is not None:
-                data = {
-                    "email": email,
-                    "name": name,
-                    "choice": " ".join(option_p10.split()[:-1]),
-                    "period": 10,
-                    "degree": int(option_p10.split()[-1][2])
-                }
-                client.table("options").insert(data).execute()
-            if option_p910 is not None:
-                data = {
-                    "email": email,
-                    "name": name,
-                    "choice": " ".join(option_p910.split()[:-1]),
-                    "period": 910,
-                    "degree": int(option_p910.split()[-1][2])
-                }
-                client.table("options").insert(data).execute()
-            if option_p9 is not None or option_p10 is not None or option_p910 is not None:
-                st.rerun()
-
-
-def gen_form(title, period, place):
+        La répartition tient compte des inscriptions déjà présentes : relancée après
+        un enregistrement, elle ne propose que les places encore à attribuer.
+    """
+
+    st.caption("À lancer après la fermeture des inscriptions.")
+    try:
+        preferences = load_preferences(client, session, catalogue)
+        registrations.load_rows()
+    except DatabaseUnavailable:
+        st.error(DB_ERROR)
+        return
+
+    if len(preferences) == 0:
+        st.info("Aucun choix enregistré pour cette session")
+        return
+
+    registered = {email: [registration.period for registration in rows]
+                  for email, rows in registrations.by_email.items()}
+    result = allocate(catalogue, preferences, registrations.counts, registered)
+
+    st.write(f"{len(preferences)} élèves ont fait des choix : {len(result.assigned)} à inscrire, "
+             f"{len(result.unassigned)} sans activité")
+    st.dataframe([{"choix": f"Choix {rank}", "inscriptions": count} for rank, count in result.by_rank().items()],
+                 width="stretch", hide_index=True)
+    if len(result.unassigned) > 0:
+        with st.expander("Sans activité"):
+            st.dataframe([display_name(email) for email in result.unassigned], column_config={"value": "Prénom/Nom"})
+
+    if st.button("Enregistrer les inscriptions", type="primary", disabled=len(result.assigned) == 0):
+        try:
+            written, refused = write_allocation(client, registrations, result)
+        except DatabaseUnavailable:
+            st.error(DB_ERROR)
+            return
+        st.success(f"{written} inscriptions enregistrées")
+        if len(refused) > 0:
+            st.warning(f"{len(refused)} inscriptions refusées par la base (relancer la répartition pour les replacer)")
+            st.dataframe([{"Prénom/Nom": display_name(item["email"]),
+                           "Activité": f"{item['choice']} (P{item['period']})",
+                           "Motif": "groupe complet" if item["status"] == FULL else "période déjà prise"}
+                          for item in refused], width="stretch", hide_index=True)
+
+
+def gen_preferences(rem_p9: bool, rem_p10: bool):
+    """
+        Formulaire du mode préférences : l’élève classe jusqu’à MAX_PREFERENCES
+        activités des périodes encore libres (l’ordre de sélection est l’ordre de
+        préférence). Les places sont attribuées à la fermeture des inscriptions.
+
+        Args:
+            rem_p9 (bool): True si l’élève est déjà inscrit en P9.
+            rem_p10 (bool): True si l’élève est déjà inscrit en P10.
+    """
+
+    periods = [period for period, taken in ((9, rem_p9), (10, rem_p10), (910, rem_p9 or rem_p10)) if not taken]
+    activities = [activity for period in periods for activity in catalogue.for_student(student_degree, period)]
+    if len(activities) == 0:
+        st.info("Aucune inscription pour toi")
+        return
+
+    if "saved_preferences" not in st.session_state:
+        try:
+            saved = fetch_preferences(client, session, student_email)
+        except DatabaseUnavailable:
+            st.error(DB_ERROR)
+            return
+        st.session_state["saved_preferences"] = [(data["choice"], data["period"]) for data in saved]
+    saved = [activity for choice, period in st.session_state["saved_preferences"]
+             if (activity := catalogue.find(student_degree, period, choice)) in activities]
+
+    with st.form("preferences"):
+        st.write(f"Classe jusqu'à {MAX_PREFERENCES} activités, de la préférée à la moins préférée. "
+                 "Les places seront attribuées à la fermeture des inscriptions.")
+        selected = st.multiselect(
+            "Mes choix",
+            activities,
+            default=saved,
+            max_selections=MAX_PREFERENCES,
+            format_func=lambda activity: activity.label + (" (P9 et P10)" if activity.period == 910
+                                                           else f" (P{activity.period})"),
+            placeholder="Choisir une activité"
+        )
+        submitted = st.form_submit_button("Enregistrer mes choix", width="stretch")
+
+    if submitted:
+        try:
+            save_preferences(client, session, student_email, student_name, student_degree, selected)
+        except DatabaseUnavailable:
+            st.error(DB_ERROR)
+            return
+        st.session_state["saved_preferences"] = [(activity.label, activity.period) for activity in selected]
+        st.success("Tes choix sont enregistrés")
+    elif len(saved) > 0:
+        st.caption("Choix enregistrés : " + ", ".join(f"{rank}. {activity.label}"
+                                                     for rank, activity in enumerate(saved, start=1)))
+
+
+def gen_form(activity: Activity, place: int):
     """
         Génère un formulaire Streamlit pour une activité donnée.
 
@@ -230,17 +562,19 @@ def gen_form(title, period, place):
         - le nombre de places restantes,
         - un bouton d’inscription activé ou non selon la disponibilité.
 
-        En cas de soumission valide, l’inscription est enregistrée
-        dans la table `options`.
+        En cas de soumission, la place est réservée de façon atomique par la base
+        (`reserve_option`) : le nombre de places affiché peut être périmé, la base
+        refuse l’inscription si le groupe est complet ou si l’élève est déjà inscrit.
+        Si la base ne répond pas et que le cache local est actif, l’inscription est
+        acceptée localement puis confirmée (ou refusée) par la base plus tard.
 
         Args:
-            title (str): Nom de l’activité.
-            period (int): Période concernée (9, 10 ou 910).
-            place (int): Nombre de places restantes.
+            activity (Activity): Activité du catalogue (nom, période, places, degrés).
+            place (int): Nombre de places restantes (affichage).
     """
 
-    with st.form(title + f"_p{period}"):
-        st.write(title)
+    with st.form(activity.label + f"_p{activity.period}"):
+        st.write(activity.label)
 
         col1, col2 = st.columns([3, 1])
         with col1:
@@ -258,18 +592,34 @@ def gen_form(title, period, place):
                 submitted = st.form_submit_button("S'inscrire", width="stretch")
             else:
                 submitted = st.form_submit_button("S'inscrire", width="stretch", disabled=True)
-        if submitted:
-            data = {
-                "email": student_email,
-                "name": student_name,
-                "choice": title,
-                "period": period,
-                "degree": student_degree
-            }
-            if place > 0:
-                client.table("options").insert(data).execute()
-            st.rerun()
+        if submitted and place > 0:
+            stored = True
+            try:
+                result = registrations.reserve(student_email, student_name, activity.label, activity.period,
+                                               student_degree, activity.capacity, list(activity.pool_degrees))
+            except DatabaseUnavailable:
+                if local_cache is None:
+                    st.error(DB_ERROR)
+                    return
+                # Inscription gardée localement, envoyée à la base dès qu’elle répond ; les
+                # inscriptions confirmées gardées dans la session restent la seule copie
+                stored = False
+                cached = st.session_state.get("registered_options")
+                taken = [choice["period"] for choice in cached[1]] if cached is not None else []
+                result = local_cache.reserve(session, student_email, student_name, activity.label, activity.period,
+                                             student_degree, activity.capacity, list(activity.pool_degrees),
+                                             get_registered_count(activity), taken)
+
+            if result == RESERVED:
+                if stored:
+                    st.session_state.pop("registered_options", None)
+                st.rerun(scope="fragment")
+            elif result == FULL:
+                st.error("Le groupe vient d'être complété")
+            else:
+                st.error("Tu as déjà une inscription pour cette période")
 
+@timed("gen_registration")
 def gen_registration(period: int):
     """
         Génère l’ensemble des formulaires d’inscription pour une période donnée.
@@ -293,124 +643,528 @@ def gen_registration(period: int):
             st.markdown(f"#### Ateliers")
         else:
             st.markdown(f"#### Remédiations P9 et P10")
-        choice_list = options_p910_list
     else:
         if ATELIER_MODE:
             st.markdown(f"#### Ateliers P{period}")
         else:
             st.markdown(f"#### Remédiations P{period}")
-        choice_list = options_list
-
-    for title, place in choice_list[f"D{student_degree}"].items():
-        if title + f" P{period} D{student_degree}" in already_registered:
-            place = max(place - already_registered[title + f" P{period} D{student_degree}"], 0)
-        gen_form(title, period, place)
-    if "D2_D3" in choice_list and student_degree > 1:
-        for title, place in choice_list["D2_D3"].items():
-            if title + f" P{period} D2" in already_registered:
-                place = max(place - already_registered[title + f" P{period} D2"], 0)
-            if title + f" P{period} D3" in already_registered:
-                place = max(place - already_registered[title + f" P{period} D3"], 0)
-            gen_form(title, period, place)
+
+    for activity in catalogue.for_student(student_degree, period):
+        gen_form(activity, max(get_place_left(activity), 0))
 
     st.divider()
 
 
-def get_not_registered():
+@timed("get_registered_options")
+def get_registered_options():
+    """
+        Récupère les inscriptions de l’élève connecté.
+
+        Seules les lignes de l’élève sont demandées (colonne indexée `email_normalized`).
+        Le résultat est gardé dans la session pendant OWN_REGISTRATIONS_TTL secondes,
+        ou jusqu’à une nouvelle inscription de l’élève. Si la base ne répond pas,
+        le dernier résultat connu est réutilisé.
+
+        Returns:
+            list[dict]: Inscriptions de l’élève dans la table `options`.
+    """
+
+    cached = st.session_state.get("registered_options")
+    if not registered_options_expired():
+        return cached[1]
+
     try:
-        all_students = client.table("students").select("*").execute()
-    except httpx.ReadError:
-        st.rerun()
+        data = fetch_registered_options(student_email)
+    except DatabaseUnavailable:
+        if cached is None:
+            raise
+        return cached[1]
+    st.session_state["registered_options"] = (time.monotonic(), data)
+    return data
 
-    all_email_d1 = []
-    all_email_d2 = []
-    all_email_d3 = []
 
-    for student in all_students.data:
-        email = student["email"].lower()
-        if student["degree"] == 1:
-            all_email_d1.append(email)
-        elif student["degree"] == 2:
-            all_email_d2.append(email)
-        elif student["degree"] == 3:
-            all_email_d3.append(email)
+def registered_options_expired() -> bool:
+    """
+        Indique si les inscriptions de l’élève gardées dans la session doivent être relues.
+    """
 
-    for student_registered in response_options.data:
-        degree = student_registered["degree"]
-        email = student_registered["email"].lower()
+    cached = st.session_state.get("registered_options")
+    return cached is None or time.monotonic() - cached[0] >= OWN_REGISTRATIONS_TTL
 
-        if degree == 1 and email in all_email_d1:
-            all_email_d1.remove(email)
-        if degree == 2 and email in all_email_d2:
-            all_email_d2.remove(email)
-        if degree == 3 and email in all_email_d3:
-            all_email_d3.remove(email)
 
-    return all_email_d1, all_email_d2, all_email_d3
+@timed("fetch_registered_options")
+def fetch_registered_options(email: str) -> list[dict]:
+    """
+        Lit les inscriptions d’un élève pour la session en cours (index (session, email_normalized)).
+    """
 
+    return (client.table("options").select("*")
+            .eq("session", session).eq("email_normalized", email.lower()).execute().data)
 
-def create_excel_file():
 
-    wb = Workbook()
-    ws = wb.active
+@timed("fetch_student_degree")
+def fetch_student_degree(email: str) -> int:
+    """
+        Lit le degré d’un utilisateur (4 = professeur, 0 = inconnu), ou le dernier
+        degré connu du cache local si la base ne répond pas.
+    """
 
-    ws.title = "D1"
-    wb.create_sheet("D2")
-    wb.create_sheet("D3")
-    wb.create_sheet("D2-D3")
+    try:
+        response = client.table("students").select("degree").eq("email_normalized", email.lower()).execute()
+    except DatabaseUnavailable:
+        degree = local_cache.student_degree(email) if local_cache is not None else None
+        if degree is None:
+            raise
+        return degree
 
-    alphabetic = string.ascii_uppercase
-    colors = ["FF99CC", "CC99FF", "FFCC99", "3366FF", "33CCCC"]
+    degree = int(response.data[0]["degree"]) if len(response.data) > 0 else 0
+    if local_cache is not None and degree > 0:
+        local_cache.store_student(email, degree)
+    return degree
 
-    for sheet, degree in enumerate(["D1", "D2", "D3", "D2_D3"]):
-        wb.active = sheet
-        ws = wb.active
 
-        row_offset = 1
-        # Set title
-        for period in (9, 10, 910):
-            ws.row_dimensions[row_offset].height = 50
+@timed("load_session_data")
+def load_session_data() -> int:
+    """
+        Charge en parallèle les données indépendantes du début de page :
+        - degré de l’utilisateur (une fois par session),
+        - comptages des inscriptions (instantané partagé, selon son TTL),
+        - inscriptions de l’élève (sauf professeur, selon OWN_REGISTRATIONS_TTL).
+
+        Si les comptages ne peuvent pas être relus, le dernier instantané est conservé.
+
+        Returns:
+            int: Degré de l’utilisateur.
+
+        Raises:
+            DatabaseUnavailable: Si le degré de l’utilisateur ne peut pas être lu.
+    """
+
+    calls = {"counts": registrations.refresh}
+    if "student_degree" not in st.session_state:
+        calls["degree"] = lambda: fetch_student_degree(student_email)
+    if st.session_state.get("student_degree") != DEGREE_PROF and registered_options_expired():
+        calls["registered_options"] = lambda: fetch_registered_options(student_email)
+
+    results, errors = load_concurrently(**calls)
+    if "degree" in errors:
+        raise errors["degree"]
+    if "counts" in errors:
+        st.warning(DB_STALE)  # Dernier instantané connu
+
+    if "degree" in results:
+        st.session_state["student_degree"] = results["degree"]
+    if "registered_options" in results:
+        st.session_state["registered_options"] = (time.monotonic(), results["registered_options"])
+    return st.session_state["student_degree"]
+
+
+def is_admitted() -> bool:
+    """
+        Vérifie si la session a passé la file d’attente (ADMISSION_QUEUE).
+
+        Tant qu’elle attend, affiche sa position et le temps d’attente estimé ;
+        le fragment qui l’appelle est relancé toutes les LIVE_REFRESH secondes.
+
+        Returns:
+            bool: True si la session peut accéder aux formulaires.
+    """
+
+    if not ADMISSION_QUEUE or st.session_state.get("admitted", False):
+        return True
 
-            row_letter = f"{alphabetic[0]}{row_offset}"
-            ws[row_letter] = f"P{period}"
-            ws[row_letter].alignment = Alignment(horizontal="center", vertical="center")
-            ws[row_letter].font = Font(bold=True)
+    queue = get_admission_queue()
+    if "admission_ticket" not in st.session_state:
+        st.session_state["admission_ticket"] = queue.join()
 
-            if period == 910:
-                options_name = options_p910_list
+    position = queue.position(st.session_state["admission_ticket"])
+    if position == 0:
+        st.session_state["admitted"] = True
+        if PREFERENCE_MODE:
+            # Page entière relancée pour arrêter le minuteur de la file d’attente
+            st.rerun()
+        return True
+
+    st.info(f"Beaucoup d'élèves s'inscrivent en même temps, merci de patienter 😊\n\n"
+            f"Position dans la file : {position} — environ {int(queue.wait_time(position)) + 1} s")
+    return False
+
+
+def wait_for_opening(window: RegistrationWindow, interval: float):
+    """
+        Minuteur de la page d’attente, exécuté comme fragment toutes les `interval`
+        secondes. Recharge la page entière dès l’ouverture, ou quand l’ouverture est
+        plus proche que le prochain réveil (le minuteur est alors reprogrammé pour
+        tomber juste après l’ouverture).
+
+        Args:
+            window (RegistrationWindow): Fenêtre d’inscription.
+            interval (float): Intervalle du minuteur, en secondes.
+    """
+
+    until_open = window.until_open()
+    if until_open is None or (interval == WINDOW_CHECK_MAX and until_open.total_seconds() + 1 < interval):
+        st.rerun()
+
+
+@timed("show_registrations")
+def show_registrations(window: RegistrationWindow, registration_open: bool):
+    """
+        Affiche les inscriptions de l’élève et les formulaires des périodes encore libres.
+
+        Exécuté comme fragment (voir plus bas) : une inscription ou le rafraîchissement
+        périodique ne redessinent que cette partie de la page, à partir des comptages
+        en mémoire, sans relancer le reste du script.
+
+        Args:
+            window (RegistrationWindow): Fenêtre d’inscription.
+            registration_open (bool): True si les inscriptions étaient ouvertes au
+                dernier chargement complet de la page.
+    """
+
+    rem_p9 = False
+    rem_p10 = False
+
+    # Fermeture pendant que la page est ouverte : la page entière est rechargée.
+    if registration_open and not window.is_open():
+        st.rerun()
+
+    if registration_open and not is_admitted():
+        return
+
+    try:
+        registrations.refresh()
+    except DatabaseUnavailable:
+        st.warning(DB_STALE)
+    try:
+        registered_options = get_registered_options()
+    except DatabaseUnavailable:
+        if local_cache is None:
+            st.error(DB_ERROR)
+            return
+        # Seules les inscriptions du cache local sont connues, la base tranchera
+        st.warning(DB_STALE)
+        registered_options = []
+
+    # Inscriptions du cache local pas encore (ou jamais) enregistrées dans la base
+    rejected = []
+    if local_cache is not None:
+        known = {(choice["choice"], choice["period"]) for choice in registered_options}
+        for choice in local_cache.registrations(session, student_email):
+            if (choice["choice"], choice["period"]) in known:
+                continue
+            if choice["status"] == REJECTED:
+                rejected.append(choice)
+            else:
+                registered_options = registered_options + [choice]
+
+    if len(registered_options) > 0:
+        st.text(f"Pour le {window.focus_label} :")
+        for choice in registered_options:
+            period = "P9 et P10" if choice["period"] == 910 else f"P{choice['period']}"
+            if choice.get("status") == PENDING:
+                st.info(f"Ton inscription en {choice['choice']} ({period}) est en attente de confirmation")
             else:
-                options_name = options_list
-            row_max = 0
-            for index, option_name in enumerate(options_name[degree]):
-                row_letter = f"{alphabetic[index + 1]}{row_offset}"
+                st.success(f"Tu es inscrit en {choice['choice']} ({period})")
+
+            if choice["period"] == 9:
+                rem_p9 = True
+            elif choice["period"] == 10:
+                rem_p10 = True
+            elif choice["period"] == 910:
+                rem_p9 = True
+                rem_p10 = True
+        st.divider()
+
+    for choice in rejected:
+        if not (rem_p9 if choice["period"] == 9 else rem_p10 if choice["period"] == 10 else rem_p9 or rem_p10):
+            reason = "déjà inscrit sur cette période" if choice["result"] == ALREADY_REGISTERED else "groupe complet"
+            st.error(f"Ton inscription en {choice['choice']} n'a pas pu être confirmée "
+                     f"({reason}), choisis une autre activité")
+
+    if registration_open and PREFERENCE_MODE:
+        gen_preferences(rem_p9, rem_p10)
+    elif registration_open:
+        no_registration = True
+        if student_degree >= 1:
+            if len(catalogue.for_student(student_degree, 9)) > 0:
+                if not rem_p9:
+                    gen_registration(period=9)
+                if not rem_p10:
+                    gen_registration(period=10)
+                no_registration = False
+            if len(catalogue.for_student(student_degree, 910)) > 0:
+                if not rem_p9 and not rem_p10:
+                    gen_registration(period=910)
+                no_registration = False
+
+        if no_registration:
+            st.info("Aucune inscription pour toi")
+
+
+@st.fragment
+@timed("show_groups")
+def show_groups():
+    """
+        Vue professeur des groupes : membres de chaque activité, élèves non inscrits
+        et export Excel. Seule cette vue charge la liste complète des inscriptions.
+
+        Les groupes sont ceux de l’instantané (`registrations.by_activity`), mis à jour
+        au fil des inscriptions ; ils sont affichés repliés, GROUPS_PER_PAGE par page.
+    """
+
+    # Lignes et élèves non inscrits sont lus en même temps
+    results, errors = load_concurrently(rows=registrations.load_rows, not_registered=registrations.not_registered)
+    if len(errors) > 0:
+        st.warning(DB_STALE)
+
+    if len(registrations.rows) > 0:
+        # Groupes tenus à jour par l’instantané : rien n’est reconstruit ici.
+        by_activity = registrations.by_activity
+        choices = sorted({choice for choice, _ in by_activity})
+        pages = (len(choices) + GROUPS_PER_PAGE - 1) // GROUPS_PER_PAGE
+        page = min(st.session_state.get("groups_page", 0), pages - 1)
+
+        with st.container(border=True):
+            st.caption(f"{len(choices)} activités, {len(registrations.rows)} inscriptions")
+            for choice in choices[page * GROUPS_PER_PAGE:(page + 1) * GROUPS_PER_PAGE]:
+                members = [{"name": registration.name, "degree": registration.degree, "period": period}
+                           for period in (9, 10, 910) for registration in by_activity.get((choice, period), ())]
+                with st.expander(f"**{choice}** ({len(members)})"):
+                    st.dataframe(members, use_container_width=True, hide_index=True,
+                                 column_order=["name", "degree", "period"],
+                                 column_config={"name": "Prénom/Nom",
+                                                "degree": st.column_config.NumberColumn(
+                                                    "Degré",
+                                                    format="D%d",
+                                                ),
+                                                "period": st.column_config.NumberColumn(
+                                                    "Période",
+                                                    format="P%d",
+                                                )})
+
+            if pages > 1:
+                col1, col2, col3 = st.columns([1, 2, 1])
+                with col1:
+                    if st.button("Précédents", key="groups_previous", disabled=page == 0, width="stretch"):
+                        st.session_state["groups_page"] = page - 1
+                        st.rerun(scope="fragment")
+                with col2:
+                    st.caption(f"Page {page + 1} / {pages}")
+                with col3:
+                    if st.button("Suivants", key="groups_next", disabled=page == pages - 1, width="stretch"):
+                        st.session_state["groups_page"] = page + 1
+                        st.rerun(scope="fragment")
+        with st.expander("Pas inscrit"):
+            not_reg = get_not_registered(results.get("not_registered"))
+            not_reg_d1 = [" ".join(name.split("@")[0].split(".")).title() for name in not_reg[0]]
+            not_reg_d2 = [" ".join(name.split("@")[0].split(".")).title() for name in not_reg[1]]
+            not_reg_d3 = [" ".join(name.split("@")[0].split(".")).title() for name in not_reg[2]]
+            with st.expander("D1"):
+                st.write(f"{len(not_reg_d1)} élèves ne sont pas inscrits")
+                st.dataframe(not_reg_d1, column_config={"value": "Prénom/Nom"})
+            with st.expander("D2"):
+                st.write(f"{len(not_reg_d2)} élèves ne sont pas inscrits")
+                st.dataframe(not_reg_d2, column_config={"value": "Prénom/Nom"})
+            with st.expander("D3"):
+                st.write(f"{len(not_reg_d3)} élèves ne sont pas inscrits")
+                st.dataframe(not_reg_d3, column_config={"value": "Prénom/Nom"})
+
+        st.download_button("Exporter en fichier Excel", width="stretch", type="primary",
+                           data=create_excel_file,
+                           file_name="export.xlsx",
+                           on_click="ignore")
+    else:
+        st.info("Aucun groupe pour l'instant")
+
+
+@st.cache_data(ttl=300)
+def load_session_counts() -> list[dict]:
+    """
+        Nombre d’inscrits par session, activité et période (vue `session_counts`,
+        sessions archivées comprises). Gardé en cache 5 minutes.
+
+        Returns:
+            list[dict]: Lignes {"session", "choice", "period", "registered"}.
+    """
+
+    return client.table("session_counts").select("session, choice, period, registered").execute().data
+
+
+@st.fragment
+@timed("show_sessions")
+def show_sessions():
+    """
+        Vue professeur de comparaison des sessions : inscrits par activité pour
+        chaque date du Focus Time, et archivage des sessions passées.
+    """
+
+    try:
+        session_counts = load_session_counts()
+    except DatabaseUnavailable:
+        st.error(DB_ERROR)
+        return
+
+    if len(session_counts) == 0:
+        st.info("Aucune session pour l'instant")
+    else:
+        sessions = sorted({data["session"] for data in session_counts}, reverse=True)
+        labels = {value: format_date(value) for value in sessions}
+
+        table_data = {}
+        totals = {label: 0 for label in labels.values()}
+        for data in session_counts:
+            row = table_data.setdefault((data["choice"], data["period"]),
+                                        {"Activité": data["choice"], "Période": f"P{data['period']}"})
+            row[labels[data["session"]]] = data["registered"]
+            totals[labels[data["session"]]] += data["registered"]
+
+        rows = [table_data[key] for key in sorted(table_data)]
+        rows.append({"Activité": "Total", "Période": "", **totals})
+        st.dataframe(rows, width="stretch", hide_index=True,
+                     column_order=["Activité", "Période", *labels.values()])
+
+    if st.button(f"Archiver les sessions antérieures au {format_date(session)}", width="stretch"):
+        try:
+            moved = client.rpc("archive_sessions", {"p_before": session}).execute().data
+        except DatabaseUnavailable:
+            st.error(DB_ERROR)
+            return
+        st.success(f"{moved} inscriptions archivées")
+
+
+def format_date(value: str) -> str:
+    """
+        Date ISO ("2026-06-09") au format affiché ("09/06/2026").
+    """
+
+    return datetime.fromisoformat(value).strftime("%d/%m/%Y")
+
+
+@timed("get_not_registered")
+def get_not_registered(not_registered: dict | None = None):
+    """
+        Liste les élèves qui ne sont inscrits à aucune activité, par degré.
+
+        Args:
+            not_registered (dict | None): Résultat déjà lu de `registrations.not_registered()`,
+                                          relu si None.
+
+        Returns:
+            tuple[list[str], list[str], list[str]]: Emails des élèves D1, D2 et D3.
+    """
+
+    if not_registered is None:
+        try:
+            not_registered = registrations.not_registered()
+        except DatabaseUnavailable:
+            st.error(DB_ERROR)
+            return [], [], []
+
+    return not_registered[1], not_registered[2], not_registered[3]
+
+
+@st.cache_data(max_entries=2)
+def build_excel_file(session: str, version: int, catalogue_version: tuple, _catalogue: Catalogue,
+                     _by_activity: dict) -> bytes:
+    """
+        Construit l’export Excel des groupes (une feuille par degré, un bloc par période).
+
+        Les inscriptions sont lues dans l’index (activité, période) de l’instantané,
+        déjà trié par nom, puis écrites ligne par ligne avec le mode streaming
+        d’openpyxl (`write_only`). Le résultat est mis en cache pour chaque version
+        de l’instantané.
+
+        Args:
+            session (str): Session du Focus Time (clé du cache).
+            version (int): Version de l’instantané des inscriptions (clé du cache).
+            catalogue_version (tuple): Clé du catalogue (clé du cache).
+            _catalogue (Catalogue): Catalogue des activités.
+            _by_activity (dict): Inscrits par (activité, période) (non utilisés pour la clé du cache).
+
+        Returns:
+            bytes: Contenu du fichier .xlsx.
+    """
+
+    colors = ["FF99CC", "CC99FF", "FFCC99", "3366FF", "33CCCC"]
+    alignment = Alignment(horizontal="center", vertical="center")
+    font = Font(bold=True)
+
+    wb = Workbook(write_only=True)
+    for degree, sheet_title in (("D1", "D1"), ("D2", "D2"), ("D3", "D3"), ("D2_D3", "D2-D3")):
+        ws = wb.create_sheet(sheet_title)
+
+        # Les largeurs de colonnes doivent être fixées avant la première ligne
+        width = max(len(_catalogue.in_scope(degree, 9)), len(_catalogue.in_scope(degree, 910)))
+        for column in range(2, width + 2):
+            ws.column_dimensions[get_column_letter(column)].width = 40
+
+        row_index = 1
+        for period in (9, 10, 910):
+            option_names = [activity.label for activity in _catalogue.in_scope(degree, period)]
+
+            # Titre
+            ws.row_dimensions[row_index].height = 50
+            title = WriteOnlyCell(ws, value=f"P{period}")
+            title.alignment = alignment
+            title.font = font
+            header = [title]
+            for index, option_name in enumerate(option_names):
                 set_color = colors[index % len(colors)]
-                ws[row_letter] = option_name
-                ws[row_letter].fill = PatternFill(start_color=set_color, end_color=set_color, fill_type="solid")
-                ws[row_letter].alignment = Alignment(horizontal="center", vertical="center")
-                ws[row_letter].font = Font(bold=True)
-                ws.column_dimensions[f"{alphabetic[index + 1]}"].width = 40
-
-                option_group = []
-                for data in response_options.data:
-                    if data["choice"] == option_name and data["period"] == period:
-                        first_name = data["email"].split(".")[0].lower()
-                        name = data["email"].split("@")[0].split(".")[1].lower()
-                        option_group.append(name.title() + " " + first_name.capitalize())
-                option_group.sort()
-
-                row = row_offset + 1
-                for name in option_group:
-                    ws[f"{alphabetic[index + 1]}{row}"] = name
-                    row += 1
-                if row > row_max:
-                    row_max = row
-
-            row_offset = row_max + 1
+                cell = WriteOnlyCell(ws, value=option_name)
+                cell.fill = PatternFill(start_color=set_color, end_color=set_color, fill_type="solid")
+                cell.alignment = alignment
+                cell.font = font
+                header.append(cell)
+            ws.append(header)
+            row_index += 1
+
+            columns = [[registration.sort_name for registration in _by_activity.get((option_name, period), ())]
+                       for option_name in option_names]
+            for line in range(max((len(column) for column in columns), default=0)):
+                ws.append([None] + [column[line] if line < len(column) else None for column in columns])
+                row_index += 1
+
+            ws.append([])
+            row_index += 1
 
     buffer = BytesIO()
     wb.save(buffer)
-    return buffer
+    return buffer.getvalue()
+
+
+@timed("create_excel_file")
+def create_excel_file():
+    """
+        Génère l’export Excel à la demande (appelé seulement au clic sur le bouton).
+
+        Returns:
+            bytes: Contenu du fichier .xlsx.
+    """
+
+    snapshot = get_registration_snapshot(session).load_rows()
+    return build_excel_file(session, snapshot.version, catalogue.key, catalogue, snapshot.by_activity)
+
+
+def show_metrics(recorder: Recorder):
+    """
+        Panneau de mesures (professeurs) : appels à la base et fonctions principales
+        de la dernière exécution, de la session et du processus (nombre, durée, octets).
+
+        Args:
+            recorder (Recorder): Mesures de la session.
+    """
+
+    with st.sidebar.expander("Mesures"):
+        for title, stats in (("Dernière exécution", recorder.rerun), ("Session", recorder.session),
+                             ("Processus", PROCESS)):
+            st.caption(title)
+            st.dataframe(stats.rows(), hide_index=True, width="stretch")
+
 
+if METRICS_LOG:
+    enable_logging()
+metrics = start_rerun(st.session_state)
 
 st.set_page_config(page_title="Focus Time", page_icon="📚", initial_sidebar_state="auto")
 st.title("Focus Time")
@@ -428,40 +1182,24 @@ else:
     # student_name = "Test1"
     # student_email = "test1@isa-florenville.be"
     student_degree = 0  # 0 = not fetched yet, 4 = Prof
-    registered_options = []
 
-    rem_p9 = False
-    rem_p10 = False
+    window = load_registration_window(os.path.getmtime("registration_open.json"))
+    session = window.session
 
-    with open("options.json", "r", encoding="utf-8") as file:
-        options_list = json.load(file)
-    with open("options_p910.json", "r", encoding="utf-8") as file:
-        options_p910_list = json.load(file)
+    files = catalogue_files(session)
+    catalogue = get_catalogue(files, catalogue_key(*files))
 
     client = init_db_connection()
-    try:
-        response_degree = client.table("students").select("degree").ilike("email", student_email).execute()
-    except httpx.ReadError:
-        st.rerun()
-
-    if len(response_degree.data) > 0:
-        student_degree = int(response_degree.data[0]["degree"])
+    registrations = get_registration_snapshot(session)
+    if LIVE_COUNTS:
+        start_live_counts().watch(registrations)
+    local_cache = start_local_cache().watch(registrations) if LOCAL_CACHE is not None else None
 
     try:
-        response_options = client.table("options").select("*").execute()
-    except httpx.ReadError:
-        st.rerun()
-
-    already_registered = {}
-    for data in response_options.data:
-        if data["email"].lower() == student_email.lower():
-            registered_options.append(data)
-
-        key = data["choice"] + f" P{data['period']} D{data['degree']}"
-        if key in already_registered:
-            already_registered[key] += 1
-        else:
-            already_registered[key] = 1
+        student_degree = load_session_data()
+    except DatabaseUnavailable:
+        st.error(DB_ERROR)
+        st.stop()
 
     # region Sidebar
     st.sidebar.divider()
@@ -478,108 +1216,37 @@ else:
 
         if st.button("Inscrire un élève", width="stretch", type="primary"):
             select_student()
+        if st.button("Importer un fichier", width="stretch"):
+            import_registrations()
         if st.button("Voir les groupes", width="stretch"):
-            get_not_registered()
-            if len(response_options.data) > 0:
-                with st.container(border=True):
-                    table_data = {}
-                    for data in response_options.data:
-                        if not data["choice"] in table_data:
-                            table_data[data["choice"]] = []
-                        table_data[data["choice"]].append({"name": data["name"],
-                                                           "degree": data["degree"],
-                                                           "period": data["period"]})
-
-                    for key, value in table_data.items():
-                        st.markdown(f"**{key}**")
-
-                        st.dataframe(value, use_container_width=True, hide_index=True,
-                                     column_order=["name", "degree", "period"],
-                                     column_config={"name": "Prénom/Nom",
-                                                    "degree": st.column_config.NumberColumn(
-                                                        "Degré",
-                                                        format="D%d",
-                                                    ),
-                                                    "period": st.column_config.NumberColumn(
-                                                        "Période",
-                                                        format="P%d",
-                                                    )})
-                        st.divider()
-                with st.expander("Pas inscrit"):
-                    not_reg = get_not_registered()
-                    not_reg_d1 = [" ".join(name.split("@")[0].split(".")).title() for name in not_reg[0]]
-                    not_reg_d2 = [" ".join(name.split("@")[0].split(".")).title() for name in not_reg[1]]
-                    not_reg_d3 = [" ".join(name.split("@")[0].split(".")).title() for name in not_reg[2]]
-                    with st.expander("D1"):
-                        st.write(f"{len(not_reg_d1)} élèves ne sont pas inscrits")
-                        st.dataframe(not_reg_d1, column_config={"value": "Prénom/Nom"})
-                    with st.expander("D2"):
-                        st.write(f"{len(not_reg_d2)} élèves ne sont pas inscrits")
-                        st.dataframe(not_reg_d2, column_config={"value": "Prénom/Nom"})
-                    with st.expander("D3"):
-                        st.write(f"{len(not_reg_d3)} élèves ne sont pas inscrits")
-                        st.dataframe(not_reg_d3, column_config={"value": "Prénom/Nom"})
-
-                st.download_button("Exporter en fichier Excel", width="stretch", type="primary",
-                                   data=create_excel_file,
-                                   file_name="export.xlsx",
-                                   on_click="ignore")
-            else:
-                st.info("Aucun groupe pour l'instant")
+            show_groups()
+        if st.button("Comparer les sessions", width="stretch"):
+            show_sessions()
+        if PREFERENCE_MODE and st.button("Répartir les préférences", width="stretch"):
+            allocate_preferences()
     else:
-        with open("registration_open.json", "r", encoding="utf-8") as file:
-            regis_open = json.load(file)
-
-        target_time = datetime.strptime(regis_open["from"] + " " + regis_open["from_hour"],
-                                        "%d/%m/%Y %Hh%M")
-        target_time = target_time.replace(hour=target_time.hour - TIMEZONE)
-
-        close_date = datetime.strptime(regis_open["for"],"%d/%m/%Y").date()
-
-        today = datetime.today().date()
-        now = datetime.now()
-        days_diff = (target_time.date() - today).days
-
-        registration_open = False
-        if now < target_time or today >= close_date:
+        registration_open = window.is_open()
+        if not registration_open:
             st.info("Aucune inscription pour le moment 😊")
-            if 0 <= days_diff <= 3:
-                st.info(f"Prochaine inscription le {regis_open['from']} à {regis_open['from_hour']}")
+            if window.is_announced():
+                st.info(f"Prochaine inscription le {window.opens_label} à {window.opens_hour}")
             st.divider()
-        else:
-            registration_open = True
 
-        if len(registered_options) > 0:
-            st.text(f"Pour le {regis_open['for']} :")
-            for choice in registered_options:
-                if choice["period"] == 910:
-                    st.success(f"Tu es inscrit en {choice["choice"]} (P9 et P10)")
-                else:
-                    st.success(f"Tu es inscrit en {choice["choice"]} (P{choice["period"]})")
-
-                if choice["period"] == 9:
-                    rem_p9 = True
-                elif choice["period"] == 10:
-                    rem_p10 = True
-                elif choice["period"] == 910:
-                    rem_p9 = True
-                    rem_p10 = True
-            st.divider()
+            # Page rechargée automatiquement à l’ouverture (une seconde après)
+            until_open = window.until_open()
+            if until_open is not None:
+                interval = min(until_open.total_seconds() + 1, WINDOW_CHECK_MAX)
+                st.fragment(wait_for_opening, run_every=interval)(window, interval)
 
-        if registration_open:
-            no_registration = True
-            if student_degree >= 1:
-                if len(options_list[f"D{student_degree}"]) > 0:
-                    if not rem_p9:
-                        gen_registration(period=9)
-                    if not rem_p10:
-                        gen_registration(period=10)
-                    no_registration = False
-                if len(options_p910_list[f"D{student_degree}"]) > 0 or (len(options_p910_list["D2_D3"]) and student_degree >= 2):
-                    if not rem_p9 and not rem_p10:
-                        gen_registration(period=910)
-                    no_registration = False
-
-            if no_registration:
-                st.info("Aucune inscription pour toi")
+        # Formulaires rafraîchis périodiquement seulement pendant la fenêtre d’inscription
+        # (inutile en mode préférences : aucune place n’est attribuée avant la fermeture),
+        # et tant que la session attend dans la file d’attente
+        live = registration_open and not PREFERENCE_MODE
+        queued = registration_open and ADMISSION_QUEUE and not st.session_state.get("admitted", False)
+        st.fragment(show_registrations, run_every=LIVE_REFRESH if live or queued else None)(window, registration_open)
 
+    end_rerun()
+    if student_degree == DEGREE_PROF:
+        show_metrics(metrics)
+    if METRICS_TEXTFILE is not None:
+        write_textfile(METRICS_TEXTFILE)
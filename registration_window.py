@@ -0,0 +1,108 @@
+"""
+Fenêtre d’inscription au Focus Time (registration_open.json).
+
+Structure du fichier (heures locales, en Belgique) :
+    {"from": "02/06/2026", "from_hour": "17h30", "for": "09/06/2026"}
+Les inscriptions ouvrent le "from" à "from_hour" et ferment le jour du Focus Time
+("for") à minuit.
+
+Le fichier est lu une seule fois (tant qu’il ne change pas) et les instants
+d’ouverture et de fermeture sont calculés avec le fuseau horaire : heure d’été
+comprise et quel que soit le fuseau du serveur. Les comparaisons se font ensuite
+entre instants absolus, sans nouvelle analyse de dates.
+"""
+
+
+import json
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta
+from zoneinfo import ZoneInfo
+
+TIMEZONE = "Europe/Brussels"  # fuseau horaire des dates de registration_open.json
+ANNOUNCE_DAYS = 3  # jours avant l’ouverture pendant lesquels la date est annoncée
+
+
+@dataclass(frozen=True)
+class RegistrationWindow:
+    """
+        Fenêtre d’inscription, instants calculés une fois pour toutes.
+
+        Attributes:
+            opens_at (datetime): Ouverture (avec fuseau horaire).
+            closes_at (datetime): Fermeture : minuit le jour du Focus Time (idem).
+            focus_date (date): Date du Focus Time.
+            opens_label (str): Date d’ouverture telle qu’écrite dans le fichier ("02/06/2026").
+            opens_hour (str): Heure d’ouverture telle qu’écrite dans le fichier ("17h30").
+            focus_label (str): Date du Focus Time telle qu’écrite dans le fichier ("09/06/2026").
+    """
+
+    opens_at: datetime
+    closes_at: datetime
+    focus_date: date
+    opens_label: str
+    opens_hour: str
+    focus_label: str
+
+    @property
+    def session(self) -> str:
+        """
+            Session du Focus Time (date ISO, ex. "2026-06-09").
+        """
+
+        return self.focus_date.isoformat()
+
+    def now(self) -> datetime:
+        """
+            Heure actuelle dans le fuseau de la fenêtre.
+        """
+
+        return datetime.now(self.opens_at.tzinfo)
+
+    def is_open(self, now: datetime | None = None) -> bool:
+        """
+            Indique si les inscriptions sont ouvertes.
+        """
+
+        now = now or self.now()
+        return self.opens_at <= now < self.closes_at
+
+    def until_open(self, now: datetime | None = None) -> timedelta | None:
+        """
+            Temps restant avant l’ouverture, None si elle a déjà eu lieu.
+        """
+
+        now = now or self.now()
+        if now >= self.opens_at:
+            return None
+        return self.opens_at - now
+
+    def is_announced(self, now: datetime | None = None) -> bool:
+        """
+            True si l’ouverture a lieu dans moins de ANNOUNCE_DAYS jours (dates locales).
+        """
+
+        now = now or self.now()
+        return 0 <= (self.opens_at.date() - now.astimezone(self.opens_at.tzinfo).date()).days <= ANNOUNCE_DAYS
+
+
+def load_window(path: str = "registration_open.json", timezone: str = TIMEZONE) -> RegistrationWindow:
+    """
+        Lit le fichier de la fenêtre d’inscription.
+
+        Args:
+            path (str): Chemin de registration_open.json.
+            timezone (str): Fuseau horaire des dates du fichier (nom IANA).
+
+        Returns:
+            RegistrationWindow: Fenêtre d’inscription.
+    """
+
+    with open(path, "r", encoding="utf-8") as file:
+        data = json.load(file)
+
+    zone = ZoneInfo(timezone)
+    opens_at = datetime.strptime(data["from"] + " " + data["from_hour"], "%d/%m/%Y %Hh%M").replace(tzinfo=zone)
+    focus_date = datetime.strptime(data["for"], "%d/%m/%Y").date()
+    closes_at = datetime.combine(focus_date, time.min, tzinfo=zone)
+
+    return RegistrationWindow(opens_at, closes_at, focus_date, data["from"], data["from_hour"], data["for"])
@@ -0,0 +1,479 @@
+"""
+Instantané partagé des inscriptions au Focus Time (table `options`).
+
+Un instantané est conservé par session du Focus Time (date de l’activité) et par
+processus Streamlit (via `st.cache_resource`), partagé par toutes les sessions
+Streamlit. Toutes les requêtes sont filtrées sur la colonne indexée `session` :
+- comptage des inscrits par (activité, période, degré), calculé par Postgres
+  (vue `option_counts`) : seules quelques lignes agrégées transitent,
+- liste complète des inscriptions en objets compacts (`Registration` : attributs
+  fixes, emails normalisés et noms d’activités internés), index par adresse email
+  et par (activité, période) (membres triés par nom), chargés uniquement quand les
+  noms sont nécessaires (vues professeur, export, import, répartition),
+- rafraîchissement après un court TTL ou après une insertion faite par l’application,
+  incrémental pour les lignes (seules les nouvelles sont téléchargées puis insérées
+  dans les index et les groupes, sans reconstruire ceux-ci),
+- mise à jour des comptages par les notifications Realtime (`apply_change`) :
+  tant que l’abonnement est actif, la vue n’est relue qu’en filet de sécurité,
+- élèves non inscrits par degré (fonction `not_registered_students`), mis en cache
+  pour chaque version de l’instantané,
+- réservation atomique d’une place via la fonction Postgres `reserve_option`
+  (capacité et inscription unique par période vérifiées par la base),
+  ou de plusieurs places d’un coup via `reserve_options` (tout ou rien).
+"""
+
+
+import sys
+import threading
+import time
+
+from supabase import Client
+
+SNAPSHOT_TTL = 5  # secondes entre deux rafraîchissements
+SNAPSHOT_FULL_RELOAD = 120  # secondes entre deux rechargements complets des lignes
+SNAPSHOT_LIVE_TTL = 60  # secondes entre deux relectures des comptages quand Realtime est actif
+
+# Résultats de `RegistrationSnapshot.reserve`
+RESERVED = "ok"
+FULL = "full"
+ALREADY_REGISTERED = "already_registered"
+
+DEGREE_PROF = 4  # degré des professeurs dans la table `students`
+
+ROW_COLUMNS = "id, email, name, choice, period, degree"  # colonnes de `options` gardées en mémoire
+
+
+class RegistrationSnapshot:
+    """
+        Copie en mémoire de la table `options`, partagée entre les sessions.
+
+        Les attributs sont remplacés d’un bloc à chaque rafraîchissement : une
+        session qui en garde une référence lit toujours un état cohérent, même si
+        un autre thread rafraîchit en parallèle.
+
+        Attributes:
+            session (str): Session du Focus Time (date ISO, ex. "2026-06-09").
+            counts (dict[tuple[str, int, int], int]): Nombre d’inscrits par
+                (activité, période, degré), issu de la vue `option_counts`.
+            total (int): Nombre total d’inscriptions.
+            rows (list[Registration]): Inscriptions de la table `options`, triées
+                par id (vide tant que `load_rows` n’a pas été appelé).
+            by_email (dict[str, list[Registration]]): Inscriptions par email en
+                minuscules (idem).
+            by_activity (dict[tuple[str, int], list[Registration]]): Inscrits par
+                (activité, période), triés par nom "Nom Prenom" (idem).
+            version (int): Incrémenté à chaque changement de contenu.
+            live (bool): True tant que les comptages sont tenus à jour par Realtime.
+    """
+
+    def __init__(self, client: Client, session: str, ttl: float = SNAPSHOT_TTL,
+                 full_reload: float = SNAPSHOT_FULL_RELOAD):
+        self._client = client
+        self.session = session
+        self._ttl = ttl
+        self._full_reload = full_reload
+        self._lock = threading.Lock()
+        self._push_lock = threading.Lock()
+
+        self._counts_at = 0.0
+        self._counts_stale = True
+        self._counts_last_id = 0
+        self._pushed = {}
+
+        self._last_id = 0
+        self._rows_at = 0.0
+        self._reloaded_at = 0.0
+        self._rows_stale = True
+
+        self.counts = {}
+        self.total = 0
+        self.rows = []
+        self.by_email = {}
+        self.by_activity = {}
+        self.version = 0
+        self.live = False
+
+        self._not_registered = None
+
+    def invalidate(self):
+        """
+            Force un rafraîchissement au prochain accès
+            (à appeler après chaque insertion dans `options` ou dans `students`).
+        """
+
+        self._counts_stale = True
+        self._rows_stale = True
+        self._not_registered = None
+
+    def restore(self, counts: dict[tuple[str, int, int], int]):
+        """
+            Comptages de départ (cache local) pour un instantané qui n’a encore rien lu
+            de la base ; ils restent périmés et sont remplacés à la première lecture réussie.
+        """
+
+        with self._push_lock:
+            if self._counts_at or not counts:
+                return
+            self.counts = dict(counts)
+            self.total = sum(counts.values())
+            self.version += 1
+
+    def refresh(self) -> "RegistrationSnapshot":
+        """
+            Met à jour les comptages si le TTL est dépassé ou si l’instantané a été invalidé.
+
+            Returns:
+                RegistrationSnapshot: L’instantané lui-même, à jour.
+        """
+
+        ttl = SNAPSHOT_LIVE_TTL if self.live else self._ttl
+        if not self._expired(self._counts_stale, self._counts_at, ttl):
+            return self
+
+        with self._lock:
+            if not self._expired(self._counts_stale, self._counts_at, ttl):
+                return self
+
+            # Remis à False avant la requête : une insertion concurrente
+            # pendant le téléchargement relancera un rafraîchissement.
+            self._counts_stale = False
+            with self._push_lock:
+                pushed_before = set(self._pushed)
+            try:
+                response = (self._client.table("option_counts")
+                            .select("choice, period, degree, registered, last_id")
+                            .eq("session", self.session).execute())
+            except Exception:
+                self._counts_stale = True
+                raise
+
+            counts = {}
+            last_id = 0
+            for data in response.data:
+                counts[(data["choice"], int(data["period"]), int(data["degree"]))] = int(data["registered"])
+                last_id = max(last_id, int(data["last_id"]))
+
+            with self._push_lock:
+                # Les notifications plus récentes que la vue restent comptées. Une
+                # notification reçue pendant la requête avec un id plus petit a pu
+                # être validée après la lecture (ids attribués hors ordre) : la vue
+                # sera relue.
+                for row_id, key in list(self._pushed.items()):
+                    if row_id > last_id:
+                        counts[key] = counts.get(key, 0) + 1
+                        continue
+                    del self._pushed[row_id]
+                    if row_id not in pushed_before:
+                        self._counts_stale = True
+
+                if counts != self.counts:
+                    self.version += 1
+                self.counts = counts
+                self.total = sum(counts.values())
+                self._counts_last_id = last_id
+            self._counts_at = time.monotonic()
+
+        return self
+
+    def apply_change(self, event: str, record: dict | None, old_record: dict | None):
+        """
+            Applique une notification Realtime (table `options`) aux comptages.
+
+            Une insertion dont l’id est inférieur ou égal au plus grand id lu dans la
+            vue n’est pas comptée : elle y est peut-être déjà, ou a été validée après
+            la lecture (les ids d’une séquence ne sont pas validés dans l’ordre). La
+            vue est alors relue au prochain accès plutôt qu’après SNAPSHOT_LIVE_TTL.
+            Les modifications (UPDATE) et les notifications incomplètes forcent
+            également une relecture de la vue.
+            Les lignes d’une autre session sont ignorées.
+
+            Args:
+                event (str): "INSERT", "DELETE" ou "UPDATE".
+                record (dict | None): Nouvelle ligne (INSERT, UPDATE).
+                old_record (dict | None): Ancienne ligne (DELETE, avec REPLICA IDENTITY FULL).
+        """
+
+        data = record if event == "INSERT" else old_record
+        if event not in ("INSERT", "DELETE") or not data or "choice" not in data or "id" not in data:
+            self.invalidate()
+            return
+        if data.get("session") != self.session:
+            return
+
+        row_id = int(data["id"])
+        key = (data["choice"], int(data["period"]), int(data["degree"]))
+        with self._push_lock:
+            counts = dict(self.counts)
+            if event == "INSERT":
+                if row_id in self._pushed:
+                    return
+                if row_id <= self._counts_last_id:
+                    self._counts_stale = True
+                    return
+                self._pushed[row_id] = key
+                counts[key] = counts.get(key, 0) + 1
+            else:
+                if row_id in self._pushed:
+                    del self._pushed[row_id]
+                elif row_id > self._counts_last_id:
+                    return
+                counts[key] = max(counts.get(key, 0) - 1, 0)
+
+            self.counts = counts
+            self.total = sum(counts.values())
+            self.version += 1
+        self._rows_stale = True
+
+    def load_rows(self) -> "RegistrationSnapshot":
+        """
+            Met à jour la liste complète des inscriptions (noms, emails).
+
+            À réserver aux écrans qui affichent les élèves : seules les lignes dont
+            l’id est supérieur au dernier id connu sont téléchargées. Un rechargement
+            complet a lieu périodiquement, ou lorsque le total ne correspond plus aux
+            comptages (suppression manuelle dans la base).
+
+            Returns:
+                RegistrationSnapshot: L’instantané lui-même, lignes comprises.
+        """
+
+        self.refresh()
+        if not self._expired(self._rows_stale, self._rows_at) and len(self.rows) == self.total:
+            return self
+
+        with self._lock:
+            if not self._expired(self._rows_stale, self._rows_at) and len(self.rows) == self.total:
+                return self
+
+            self._rows_stale = False
+            try:
+                if time.monotonic() - self._reloaded_at >= self._full_reload:
+                    self._reload()
+                else:
+                    self._fetch_new()
+                    if len(self.rows) != self.total:
+                        self._reload()
+            except Exception:
+                self._rows_stale = True
+                raise
+            self._rows_at = time.monotonic()
+
+        return self
+
+    def not_registered(self) -> dict[int, list[str]]:
+        """
+            Élèves qui n’ont aucune inscription dans leur degré.
+
+            L’anti-jointure est faite par Postgres (fonction `not_registered_students`) et
+            le résultat est réutilisé tant que la version de l’instantané ne change pas
+            et que l’instantané n’est pas invalidé (import d’élèves, par exemple).
+
+            Returns:
+                dict[int, list[str]]: Emails (en minuscules, triés) par degré (1, 2, 3).
+        """
+
+        self.refresh()
+        cached = self._not_registered
+        if cached is not None and cached[0] == self.version:
+            return cached[1]
+
+        version = self.version
+        response = self._client.rpc("not_registered_students", {"p_session": self.session}).execute()
+
+        not_registered = {1: [], 2: [], 3: []}
+        for data in response.data:
+            not_registered.setdefault(int(data["degree"]), []).append(data["email"].lower())
+        for emails in not_registered.values():
+            emails.sort()
+
+        self._not_registered = (version, not_registered)
+        return not_registered
+
+    def reserve(self, email: str, name: str, choice: str, period: int, degree: int,
+                capacity: int | None, pool_degrees: list[int] | None = None) -> str:
+        """
+            Réserve une place de façon atomique puis invalide l’instantané.
+
+            La capacité et l’unicité de l’inscription par période (P910 bloque P9
+            et P10) sont vérifiées par la base de données : le résultat ne dépend
+            pas de la fraîcheur des comptages en mémoire.
+
+            Args:
+                email (str): Adresse email de l’élève.
+                name (str): Nom affiché de l’élève.
+                choice (str): Nom de l’activité.
+                period (int): Période (9, 10 ou 910).
+                degree (int): Degré de l’élève.
+                capacity (int | None): Nombre de places du groupe, None = pas de limite.
+                pool_degrees (list[int] | None): Degrés qui partagent les places
+                    (ex. [2, 3] pour un groupe D2_D3), par défaut le degré de l’élève.
+
+            Returns:
+                str: RESERVED, FULL ou ALREADY_REGISTERED.
+        """
+
+        response = self._client.rpc("reserve_option", {
+            "p_session": self.session,
+            "p_email": email,
+            "p_name": name,
+            "p_choice": choice,
+            "p_period": period,
+            "p_degree": degree,
+            "p_capacity": capacity,
+            "p_pool_degrees": pool_degrees
+        }).execute()
+
+        # Même en cas de refus, les comptages en mémoire sont manifestement périmés.
+        self.invalidate()
+        return response.data
+
+    def reserve_many(self, email: str, name: str, items: list[dict]) -> dict:
+        """
+            Réserve plusieurs activités pour un même élève en une seule transaction.
+
+            Les mêmes vérifications que `reserve` sont faites pour chaque élément,
+            conflits entre éléments compris (ex. P9 et P910) : soit toutes les
+            inscriptions sont enregistrées, soit aucune.
+
+            Args:
+                email (str): Adresse email de l’élève.
+                name (str): Nom affiché de l’élève.
+                items (list[dict]): Éléments {"choice", "period", "degree",
+                    "capacity", "pool_degrees"} (voir `reserve`).
+
+            Returns:
+                dict: {"status": RESERVED} ou {"status": FULL | ALREADY_REGISTERED,
+                      "choice": ..., "period": ...} pour le premier élément refusé.
+        """
+
+        response = self._client.rpc("reserve_options", {
+            "p_session": self.session,
+            "p_email": email,
+            "p_name": name,
+            "p_items": items
+        }).execute()
+
+        self.invalidate()
+        return response.data
+
+    def count(self, choice: str, period: int, degree: int) -> int:
+        """
+            Nombre d’inscrits pour une activité, une période et un degré.
+        """
+
+        return self.counts.get((choice, period, degree), 0)
+
+    def _expired(self, stale: bool, fetched_at: float, ttl: float | None = None) -> bool:
+        return stale or time.monotonic() - fetched_at >= (self._ttl if ttl is None else ttl)
+
+    def _reload(self):
+        response = (self._client.table("options").select(ROW_COLUMNS).eq("session", self.session)
+                    .order("id").execute())
+
+        rows = [Registration(data) for data in response.data]
+        by_email, by_activity = {}, {}
+        self._index(rows, by_email, by_activity)
+
+        if rows != self.rows:
+            self.version += 1
+        self.rows, self.by_email, self.by_activity = rows, by_email, by_activity
+        self._last_id = rows[-1].id if rows else 0
+        self._reloaded_at = time.monotonic()
+
+    def _fetch_new(self):
+        response = (self._client.table("options").select(ROW_COLUMNS).eq("session", self.session)
+                    .gt("id", self._last_id).order("id").execute())
+
+        new_rows = [Registration(data) for data in response.data]
+        if not new_rows:
+            return
+
+        by_email, by_activity = dict(self.by_email), dict(self.by_activity)
+        self._index(new_rows, by_email, by_activity)
+
+        self.rows, self.by_email, self.by_activity = self.rows + new_rows, by_email, by_activity
+        self._last_id = new_rows[-1].id
+        self.version += 1
+
+    @staticmethod
+    def _index(rows, by_email, by_activity):
+        emails, activities = {}, {}
+        for registration in rows:
+            emails.setdefault(registration.email, []).append(registration)
+            activities.setdefault(registration.key, []).append(registration)
+
+        # Nouvelles listes : celles de l’état précédent restent intactes.
+        for email, registrations in emails.items():
+            by_email[email] = by_email.get(email, []) + registrations
+        for key, registrations in activities.items():
+            # Tri presque linéaire : les membres déjà présents sont déjà triés.
+            by_activity[key] = sorted(by_activity.get(key, []) + registrations, key=_member_key)
+
+
+class Registration:
+    """
+        Une inscription de la table `options`, en mémoire.
+
+        Attributs fixes (`__slots__`) plutôt qu’un dict par ligne ; l’email normalisé
+        et le nom de l’activité sont internés (une seule chaîne partagée par toutes
+        les lignes) et le nom trié est calculé une seule fois.
+
+        Attributes:
+            id (int): Identifiant de la ligne.
+            email (str): Adresse email en minuscules.
+            name (str): Nom affiché de l’élève.
+            choice (str): Nom de l’activité.
+            period (int): Période (9, 10 ou 910).
+            degree (int): Degré enregistré.
+            sort_name (str): Nom "Nom Prenom" pour les listes triées.
+    """
+
+    __slots__ = ("id", "email", "name", "choice", "period", "degree", "sort_name")
+
+    def __init__(self, data: dict):
+        self.id = int(data["id"])
+        self.email = sys.intern(data["email"].lower())
+        self.name = data.get("name") or display_name(self.email)
+        self.choice = sys.intern(data["choice"])
+        self.period = int(data["period"])
+        self.degree = int(data["degree"])
+        self.sort_name = sort_name(self.email)
+
+    @property
+    def key(self) -> tuple[str, int]:
+        """
+            Clé de l’activité : (activité, période).
+        """
+
+        return self.choice, self.period
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Registration):
+            return NotImplemented
+        return all(getattr(self, slot) == getattr(other, slot) for slot in self.__slots__)
+
+
+def _member_key(registration: Registration) -> tuple:
+    return registration.sort_name, registration.email
+
+
+def display_name(email: str) -> str:
+    """
+        Nom affiché d’un élève à partir de son email "prenom.nom@..." ("Prenom Nom").
+    """
+
+    name = email.split("@")[0].split(".")
+    if len(name) > 1:
+        return name[0].capitalize() + " " + name[1].capitalize()
+    return name[0].capitalize()
+
+
+def sort_name(email: str) -> str:
+    """
+        Nom d’un élève pour les listes triées ("Nom Prenom"), tel qu’utilisé dans l’export Excel.
+    """
+
+    name = email.split("@")[0].lower().split(".")
+    if len(name) > 1:
+        return name[1].title() + " " + name[0].capitalize()
+    return name[0].capitalize()
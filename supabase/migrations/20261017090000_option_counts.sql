@@ -0,0 +1,12 @@
+-- Comptage des inscrits par activité, période et degré.
+-- Lu par RegistrationSnapshot.refresh() : quelques lignes agrégées au lieu
+-- de toute la table `options`.
+create or replace view public.option_counts as
+select choice,
+       period,
+       degree,
+       count(*)::int as registered
+from public.options
+group by choice, period, degree;
+
+grant select on public.option_counts to anon, authenticated;
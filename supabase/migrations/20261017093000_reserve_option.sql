@@ -0,0 +1,64 @@
+-- Réservation atomique d’une place dans une activité.
+--
+-- Vérifie dans une seule transaction, sous verrous consultatifs :
+-- - que l’élève n’a pas déjà une inscription sur la même période
+--   (P910 bloque P9 et P10, et inversement),
+-- - que le groupe n’est pas complet (p_pool_degrees permet de compter ensemble
+--   les degrés d’un groupe commun, par exemple {2, 3} pour D2_D3 ;
+--   p_capacity à null = pas de limite).
+--
+-- Retourne 'ok', 'already_registered' ou 'full'.
+create or replace function public.reserve_option(
+    p_email text,
+    p_name text,
+    p_choice text,
+    p_period int,
+    p_degree int,
+    p_capacity int default null,
+    p_pool_degrees int[] default null
+)
+returns text
+language plpgsql
+as $$
+declare
+    v_email text := lower(p_email);
+    v_periods int[];
+    v_registered int;
+begin
+    -- Toujours dans le même ordre (élève puis activité) pour éviter les interblocages.
+    perform pg_advisory_xact_lock(hashtext('options:email:' || v_email));
+    perform pg_advisory_xact_lock(hashtext('options:choice:' || p_choice || ':' || p_period));
+
+    v_periods := case p_period
+        when 9 then array[9, 910]
+        when 10 then array[10, 910]
+        else array[9, 10, 910]
+    end;
+
+    if exists (select 1
+               from public.options
+               where lower(email) = v_email
+                 and period = any(v_periods)) then
+        return 'already_registered';
+    end if;
+
+    if p_capacity is not null then
+        select count(*) into v_registered
+        from public.options
+        where choice = p_choice
+          and period = p_period
+          and degree = any(coalesce(p_pool_degrees, array[p_degree]));
+
+        if v_registered >= p_capacity then
+            return 'full';
+        end if;
+    end if;
+
+    insert into public.options (email, name, choice, period, degree)
+    values (p_email, p_name, p_choice, p_period, p_degree);
+
+    return 'ok';
+end;
+$$;
+
+grant execute on function public.reserve_option(text, text, text, int, int, int, int[]) to anon, authenticated;
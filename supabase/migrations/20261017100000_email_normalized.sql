@@ -0,0 +1,63 @@
+-- Adresse email normalisée (minuscules) et indexée, pour retrouver
+-- directement les lignes d’un élève au lieu de parcourir toute la table.
+alter table public.options
+    add column if not exists email_normalized text generated always as (lower(email)) stored;
+create index if not exists options_email_normalized_idx on public.options (email_normalized);
+
+alter table public.students
+    add column if not exists email_normalized text generated always as (lower(email)) stored;
+create index if not exists students_email_normalized_idx on public.students (email_normalized);
+
+-- reserve_option utilise désormais la colonne indexée.
+create or replace function public.reserve_option(
+    p_email text,
+    p_name text,
+    p_choice text,
+    p_period int,
+    p_degree int,
+    p_capacity int default null,
+    p_pool_degrees int[] default null
+)
+returns text
+language plpgsql
+as $$
+declare
+    v_email text := lower(p_email);
+    v_periods int[];
+    v_registered int;
+begin
+    -- Toujours dans le même ordre (élève puis activité) pour éviter les interblocages.
+    perform pg_advisory_xact_lock(hashtext('options:email:' || v_email));
+    perform pg_advisory_xact_lock(hashtext('options:choice:' || p_choice || ':' || p_period));
+
+    v_periods := case p_period
+        when 9 then array[9, 910]
+        when 10 then array[10, 910]
+        else array[9, 10, 910]
+    end;
+
+    if exists (select 1
+               from public.options
+               where email_normalized = v_email
+                 and period = any(v_periods)) then
+        return 'already_registered';
+    end if;
+
+    if p_capacity is not null then
+        select count(*) into v_registered
+        from public.options
+        where choice = p_choice
+          and period = p_period
+          and degree = any(coalesce(p_pool_degrees, array[p_degree]));
+
+        if v_registered >= p_capacity then
+            return 'full';
+        end if;
+    end if;
+
+    insert into public.options (email, name, choice, period, degree)
+    values (p_email, p_name, p_choice, p_period, p_degree);
+
+    return 'ok';
+end;
+$$;
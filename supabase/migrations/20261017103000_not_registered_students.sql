@@ -0,0 +1,12 @@
+-- Élèves sans aucune inscription dans leur degré (anti-jointure).
+create or replace view public.not_registered_students as
+select s.email,
+       s.degree
+from public.students s
+where s.degree in (1, 2, 3)
+  and not exists (select 1
+                  from public.options o
+                  where o.email_normalized = s.email_normalized
+                    and o.degree = s.degree);
+
+grant select on public.not_registered_students to anon, authenticated;
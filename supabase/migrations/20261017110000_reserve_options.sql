@@ -0,0 +1,84 @@
+-- Réservation atomique de plusieurs activités pour un même élève
+-- (inscription manuelle P9 + P10, ou P910).
+--
+-- p_items : tableau JSON d’objets
+--   {"choice": text, "period": int, "degree": int,
+--    "capacity": int | null, "pool_degrees": [int] | null}
+--
+-- Toutes les vérifications de reserve_option sont faites pour chaque élément
+-- (y compris les conflits entre éléments du lot) avant la moindre insertion :
+-- soit tout est inscrit, soit rien.
+--
+-- Retourne {"status": "ok"} ou {"status": "full" | "already_registered",
+-- "choice": ..., "period": ...} pour le premier élément refusé.
+create or replace function public.reserve_options(
+    p_email text,
+    p_name text,
+    p_items jsonb
+)
+returns jsonb
+language plpgsql
+as $$
+declare
+    v_email text := lower(p_email);
+    v_item jsonb;
+    v_period int;
+    v_blocked int[];
+    v_periods int[] := '{}';
+    v_capacity int;
+    v_registered int;
+begin
+    -- Même ordre que reserve_option (élève puis activités, triées) pour éviter les interblocages.
+    perform pg_advisory_xact_lock(hashtext('options:email:' || v_email));
+    for v_item in
+        select value
+        from jsonb_array_elements(p_items)
+        order by value->>'choice', (value->>'period')::int
+    loop
+        perform pg_advisory_xact_lock(hashtext('options:choice:' || (v_item->>'choice') || ':' || (v_item->>'period')));
+    end loop;
+
+    for v_item in select value from jsonb_array_elements(p_items) loop
+        v_period := (v_item->>'period')::int;
+        v_blocked := case v_period
+            when 9 then array[9, 910]
+            when 10 then array[10, 910]
+            else array[9, 10, 910]
+        end;
+
+        if v_periods && v_blocked
+           or exists (select 1
+                      from public.options
+                      where email_normalized = v_email
+                        and period = any(v_blocked)) then
+            return jsonb_build_object('status', 'already_registered',
+                                      'choice', v_item->>'choice', 'period', v_period);
+        end if;
+        v_periods := v_periods || v_period;
+
+        v_capacity := (v_item->>'capacity')::int;
+        if v_capacity is not null then
+            select count(*) into v_registered
+            from public.options
+            where choice = v_item->>'choice'
+              and period = v_period
+              and degree = any(coalesce(
+                  (select array_agg(value::int) from jsonb_array_elements_text(v_item->'pool_degrees')),
+                  array[(v_item->>'degree')::int]));
+
+            if v_registered >= v_capacity then
+                return jsonb_build_object('status', 'full',
+                                          'choice', v_item->>'choice', 'period', v_period);
+            end if;
+        end if;
+    end loop;
+
+    insert into public.options (email, name, choice, period, degree)
+    select p_email, p_name, value->>'choice', (value->>'period')::int, (value->>'degree')::int
+    from jsonb_array_elements(p_items);
+
+    return jsonb_build_object('status', 'ok');
+end;
+$$;
+
+grant execute on function public.reserve_options(text, text, jsonb) to anon, authenticated;
@@ -0,0 +1,5 @@
+-- Un seul élève par adresse email : nécessaire pour l’import en masse
+-- (upsert sur email_normalized). Les doublons éventuels (même adresse avec
+-- une casse différente) doivent être supprimés avant d’appliquer la migration.
+drop index if exists public.students_email_normalized_idx;
+create unique index if not exists students_email_normalized_key on public.students (email_normalized);
@@ -0,0 +1,56 @@
+-- Réservations envoyées par lot (import en masse, importer.py).
+--
+-- p_items : tableau JSON d’objets
+--   {"email": text, "name": text, "choice": text, "period": int, "degree": int,
+--    "capacity": int | null, "pool_degrees": [int] | null}
+--
+-- Chaque élément est traité comme un appel indépendant à reserve_option (mêmes
+-- vérifications, pas de tout ou rien). Les verrous sont pris d’avance dans le
+-- même ordre que les autres fonctions (élèves puis activités, chacun trié) pour
+-- éviter les interblocages avec les réservations en direct.
+--
+-- Retourne le statut de chaque élément, dans l’ordre : ["ok", "full", ...].
+create or replace function public.reserve_batch(
+    p_items jsonb
+)
+returns jsonb
+language plpgsql
+as $$
+declare
+    v_key text;
+    v_item jsonb;
+    v_results jsonb := '[]'::jsonb;
+begin
+    for v_key in
+        select distinct lower(value->>'email')
+        from jsonb_array_elements(p_items)
+        order by 1
+    loop
+        perform pg_advisory_xact_lock(hashtext('options:email:' || v_key));
+    end loop;
+    for v_item in
+        select item
+        from (select distinct jsonb_build_object('choice', value->>'choice', 'period', (value->>'period')::int) as item
+              from jsonb_array_elements(p_items)) as items
+        order by item->>'choice', (item->>'period')::int
+    loop
+        perform pg_advisory_xact_lock(hashtext('options:choice:' || (v_item->>'choice') || ':' || (v_item->>'period')));
+    end loop;
+
+    for v_item in select value from jsonb_array_elements(p_items) loop
+        v_results := v_results || jsonb_build_array(public.reserve_option(
+            v_item->>'email',
+            v_item->>'name',
+            v_item->>'choice',
+            (v_item->>'period')::int,
+            (v_item->>'degree')::int,
+            (v_item->>'capacity')::int,
+            (select array_agg(value::int) from jsonb_array_elements_text(v_item->'pool_degrees'))
+        ));
+    end loop;
+
+    return v_results;
+end;
+$$;
+
+grant execute on function public.reserve_batch(jsonb) to anon, authenticated;
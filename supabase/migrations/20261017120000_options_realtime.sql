@@ -0,0 +1,16 @@
+-- Notifications Realtime sur la table `options` (comptages poussés aux serveurs).
+-- REPLICA IDENTITY FULL : les suppressions transmettent toute l’ancienne ligne
+-- (activité, période, degré), nécessaire pour décompter la place libérée.
+alter table public.options replica identity full;
+alter publication supabase_realtime add table public.options;
+
+-- Plus grand id compté par groupe : évite de compter deux fois une insertion
+-- reçue par Realtime et déjà présente dans la vue.
+create or replace view public.option_counts as
+select choice,
+       period,
+       degree,
+       count(*)::int as registered,
+       max(id) as last_id
+from public.options
+group by choice, period, degree;
@@ -0,0 +1,5 @@
+-- Recherche d’élèves par début d’adresse (sélecteur du dialogue "Inscrire un élève") :
+-- un index text_pattern_ops permet à `email_normalized like 'prefixe%'` d’utiliser
+-- l’index quel que soit le collationnement de la base.
+create index if not exists students_email_normalized_pattern_idx
+    on public.students (email_normalized text_pattern_ops);
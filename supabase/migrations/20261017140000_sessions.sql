@@ -0,0 +1,292 @@
+-- Sessions du Focus Time : chaque inscription appartient à une session, identifiée
+-- par la date du Focus Time (champ "for" de registration_open.json). Toutes les
+-- requêtes de l’application sont filtrées par session (colonnes indexées) et les
+-- sessions terminées sont déplacées dans `options_archive` : le coût d’une page
+-- ne dépend plus de l’historique de l’année.
+
+alter table public.options add column if not exists session date;
+
+-- Inscriptions déjà présentes : elles appartiennent au Focus Time en cours (la
+-- table était vidée à la main entre deux sessions). Sa date doit être fournie
+-- avant la migration (voir README, « Déploiement ») :
+--     alter role postgres set focus_time.session = '2026-06-09';
+-- Sans elle, la migration échoue plutôt que de faire disparaître ces inscriptions
+-- des comptages et de la vérification des doublons.
+do $$
+declare
+    v_session date := nullif(current_setting('focus_time.session', true), '')::date;
+begin
+    if exists (select 1 from public.options where session is null) then
+        if v_session is null then
+            raise exception 'Inscriptions sans session : définir focus_time.session (date du Focus Time en cours) avant la migration';
+        end if;
+        update public.options set session = v_session where session is null;
+    end if;
+end;
+$$;
+
+-- Une insertion sans session échoue au lieu de disparaître des requêtes filtrées.
+alter table public.options alter column session set not null;
+
+create index if not exists options_session_counts_idx
+    on public.options (session, choice, period, degree);
+create index if not exists options_session_email_idx
+    on public.options (session, email_normalized);
+
+-- Même colonnes que `options` (email_normalized et id y sont de simples copies).
+create table if not exists public.options_archive (like public.options including defaults);
+create index if not exists options_archive_session_idx
+    on public.options_archive (session, choice, period);
+
+-- Comptages par session (colonne ajoutée en fin de vue).
+create or replace view public.option_counts as
+select choice,
+       period,
+       degree,
+       count(*)::int as registered,
+       max(id) as last_id,
+       session
+from public.options
+group by session, choice, period, degree;
+
+-- Comparaison des sessions (en cours et archivées), pour la vue professeur.
+create or replace view public.session_counts as
+select session, choice, period, count(*)::int as registered
+from (select session, choice, period from public.options
+      union all
+      select session, choice, period from public.options_archive) as all_options
+group by session, choice, period;
+
+grant select on public.session_counts to anon, authenticated;
+
+-- Élèves sans inscription dans leur degré pour une session.
+drop view if exists public.not_registered_students;
+
+create or replace function public.not_registered_students(p_session date)
+returns table (email text, degree int)
+language sql
+stable
+as $$
+    select s.email, s.degree
+    from public.students s
+    where s.degree in (1, 2, 3)
+      and not exists (select 1
+                      from public.options o
+                      where o.session = p_session
+                        and o.email_normalized = s.email_normalized
+                        and o.degree = s.degree);
+$$;
+
+grant execute on function public.not_registered_students(date) to anon, authenticated;
+
+-- Réservations : mêmes règles qu’avant, à l’intérieur d’une session.
+drop function if exists public.reserve_option(text, text, text, int, int, int, int[]);
+drop function if exists public.reserve_options(text, text, jsonb);
+
+create or replace function public.reserve_option(
+    p_session date,
+    p_email text,
+    p_name text,
+    p_choice text,
+    p_period int,
+    p_degree int,
+    p_capacity int default null,
+    p_pool_degrees int[] default null
+)
+returns text
+language plpgsql
+as $$
+declare
+    v_email text := lower(p_email);
+    v_periods int[];
+    v_registered int;
+begin
+    -- Toujours dans le même ordre (élève puis activité) pour éviter les interblocages.
+    perform pg_advisory_xact_lock(hashtext('options:email:' || p_session || ':' || v_email));
+    perform pg_advisory_xact_lock(hashtext('options:choice:' || p_session || ':' || p_choice || ':' || p_period));
+
+    v_periods := case p_period
+        when 9 then array[9, 910]
+        when 10 then array[10, 910]
+        else array[9, 10, 910]
+    end;
+
+    if exists (select 1
+               from public.options
+               where session = p_session
+                 and email_normalized = v_email
+                 and period = any(v_periods)) then
+        return 'already_registered';
+    end if;
+
+    if p_capacity is not null then
+        select count(*) into v_registered
+        from public.options
+        where session = p_session
+          and choice = p_choice
+          and period = p_period
+          and degree = any(coalesce(p_pool_degrees, array[p_degree]));
+
+        if v_registered >= p_capacity then
+            return 'full';
+        end if;
+    end if;
+
+    insert into public.options (session, email, name, choice, period, degree)
+    values (p_session, p_email, p_name, p_choice, p_period, p_degree);
+
+    return 'ok';
+end;
+$$;
+
+grant execute on function public.reserve_option(date, text, text, text, int, int, int, int[]) to anon, authenticated;
+
+create or replace function public.reserve_options(
+    p_session date,
+    p_email text,
+    p_name text,
+    p_items jsonb
+)
+returns jsonb
+language plpgsql
+as $$
+declare
+    v_email text := lower(p_email);
+    v_item jsonb;
+    v_period int;
+    v_blocked int[];
+    v_periods int[] := '{}';
+    v_capacity int;
+    v_registered int;
+begin
+    perform pg_advisory_xact_lock(hashtext('options:email:' || p_session || ':' || v_email));
+    for v_item in
+        select value
+        from jsonb_array_elements(p_items)
+        order by value->>'choice', (value->>'period')::int
+    loop
+        perform pg_advisory_xact_lock(hashtext('options:choice:' || p_session || ':' || (v_item->>'choice') || ':' || (v_item->>'period')));
+    end loop;
+
+    for v_item in select value from jsonb_array_elements(p_items) loop
+        v_period := (v_item->>'period')::int;
+        v_blocked := case v_period
+            when 9 then array[9, 910]
+            when 10 then array[10, 910]
+            else array[9, 10, 910]
+        end;
+
+        if v_periods && v_blocked
+           or exists (select 1
+                      from public.options
+                      where session = p_session
+                        and email_normalized = v_email
+                        and period = any(v_blocked)) then
+            return jsonb_build_object('status', 'already_registered',
+                                      'choice', v_item->>'choice', 'period', v_period);
+        end if;
+        v_periods := v_periods || v_period;
+
+        v_capacity := (v_item->>'capacity')::int;
+        if v_capacity is not null then
+            select count(*) into v_registered
+            from public.options
+            where session = p_session
+              and choice = v_item->>'choice'
+              and period = v_period
+              and degree = any(coalesce(
+                  (select array_agg(value::int) from jsonb_array_elements_text(v_item->'pool_degrees')),
+                  array[(v_item->>'degree')::int]));
+
+            if v_registered >= v_capacity then
+                return jsonb_build_object('status', 'full',
+                                          'choice', v_item->>'choice', 'period', v_period);
+            end if;
+        end if;
+    end loop;
+
+    insert into public.options (session, email, name, choice, period, degree)
+    select p_session, p_email, p_name, value->>'choice', (value->>'period')::int, (value->>'degree')::int
+    from jsonb_array_elements(p_items);
+
+    return jsonb_build_object('status', 'ok');
+end;
+$$;
+
+grant execute on function public.reserve_options(date, text, text, jsonb) to anon, authenticated;
+
+-- Réservations envoyées par lot (import en masse, répartition des préférences,
+-- écriture différée du cache local) : même fonction, limitée à une session.
+-- Chaque élément est traité comme un appel indépendant à reserve_option ; les
+-- verrous sont pris d’avance, élèves puis activités, chacun trié.
+drop function if exists public.reserve_batch(jsonb);
+
+create or replace function public.reserve_batch(
+    p_session date,
+    p_items jsonb
+)
+returns jsonb
+language plpgsql
+as $$
+declare
+    v_key text;
+    v_item jsonb;
+    v_results jsonb := '[]'::jsonb;
+begin
+    for v_key in
+        select distinct lower(value->>'email')
+        from jsonb_array_elements(p_items)
+        order by 1
+    loop
+        perform pg_advisory_xact_lock(hashtext('options:email:' || p_session || ':' || v_key));
+    end loop;
+    for v_item in
+        select item
+        from (select distinct jsonb_build_object('choice', value->>'choice', 'period', (value->>'period')::int) as item
+              from jsonb_array_elements(p_items)) as items
+        order by item->>'choice', (item->>'period')::int
+    loop
+        perform pg_advisory_xact_lock(hashtext('options:choice:' || p_session || ':' || (v_item->>'choice') || ':' || (v_item->>'period')));
+    end loop;
+
+    for v_item in select value from jsonb_array_elements(p_items) loop
+        v_results := v_results || jsonb_build_array(public.reserve_option(
+            p_session,
+            v_item->>'email',
+            v_item->>'name',
+            v_item->>'choice',
+            (v_item->>'period')::int,
+            (v_item->>'degree')::int,
+            (v_item->>'capacity')::int,
+            (select array_agg(value::int) from jsonb_array_elements_text(v_item->'pool_degrees'))
+        ));
+    end loop;
+
+    return v_results;
+end;
+$$;
+
+grant execute on function public.reserve_batch(date, jsonb) to anon, authenticated;
+
+-- Archive les sessions antérieures à p_before. Retourne le nombre de lignes déplacées.
+create or replace function public.archive_sessions(p_before date)
+returns int
+language plpgsql
+as $$
+declare
+    v_moved int;
+begin
+    with moved as (
+        delete from public.options
+        where session < p_before
+        returning *
+    )
+    insert into public.options_archive
+    select * from moved;
+
+    get diagnostics v_moved = row_count;
+    return v_moved;
+end;
+$$;
+
+grant execute on function public.archive_sessions(date) to anon, authenticated;
@@ -0,0 +1,50 @@
+-- Mode préférences : chaque élève classe quelques activités pendant la fenêtre
+-- d’inscription ; la répartition est calculée à la fermeture par l’application
+-- (allocation.py) et écrite dans `options` en une seule requête.
+
+create table if not exists public.preferences (
+    id bigint generated by default as identity primary key,
+    session date not null,
+    email text not null,
+    email_normalized text generated always as (lower(email)) stored,
+    name text not null,
+    degree int not null,
+    choice text not null,
+    period int not null,
+    rank int not null,
+    created_at timestamptz not null default now(),
+    unique (session, email_normalized, rank)
+);
+
+grant select on public.preferences to anon, authenticated;
+
+-- Remplace tous les choix d’un élève pour une session (ordre du tableau = rang).
+--
+-- p_items : tableau JSON d’objets {"choice": text, "period": int}
+create or replace function public.save_preferences(
+    p_session date,
+    p_email text,
+    p_name text,
+    p_degree int,
+    p_items jsonb
+)
+returns int
+language plpgsql
+as $$
+declare
+    v_saved int;
+begin
+    delete from public.preferences
+    where session = p_session
+      and email_normalized = lower(p_email);
+
+    insert into public.preferences (session, email, name, degree, choice, period, rank)
+    select p_session, p_email, p_name, p_degree, item.value->>'choice', (item.value->>'period')::int, item.rank::int
+    from jsonb_array_elements(p_items) with ordinality as item(value, rank);
+
+    get diagnostics v_saved = row_count;
+    return v_saved;
+end;
+$$;
+
+grant execute on function public.save_preferences(date, text, text, int, jsonb) to anon, authenticated;
@@ -0,0 +1,59 @@
+"""
+File d’attente à l’ouverture (admission.py) : débit du seau à jetons et ordre
+d’arrivée.
+"""
+
+
+import pytest
+
+import admission
+from admission import AdmissionQueue
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(admission.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_burst_then_rate(clock):
+    queue = AdmissionQueue(rate=2, burst=3)
+    tickets = [queue.join() for _ in range(8)]
+
+    assert [queue.position(ticket) for ticket in tickets] == [0, 0, 0, 1, 2, 3, 4, 5]
+
+    clock[0] += 1  # deux jetons
+    assert [queue.position(ticket) for ticket in tickets] == [0, 0, 0, 0, 0, 1, 2, 3]
+
+    clock[0] += 0.4  # pas encore de jeton entier
+    assert queue.position(tickets[5]) == 1
+
+    clock[0] += 0.1
+    assert queue.position(tickets[5]) == 0
+    assert queue.position(tickets[6]) == 1
+
+
+def test_tokens_are_capped_at_burst(clock):
+    queue = AdmissionQueue(rate=5, burst=2)
+    clock[0] += 60
+    tickets = [queue.join() for _ in range(5)]
+
+    assert [queue.position(ticket) for ticket in tickets] == [0, 0, 1, 2, 3]
+
+
+def test_admitted_in_arrival_order(clock):
+    queue = AdmissionQueue(rate=1, burst=1)
+    first, second, third = queue.join(), queue.join(), queue.join()
+
+    # Le ticket le plus récent interroge la file en premier : le jeton va au plus ancien
+    assert queue.position(third) == 2
+    assert queue.position(first) == 0
+
+    clock[0] += 1
+    assert queue.position(third) == 1
+    assert queue.position(second) == 0
+
+
+def test_wait_time(clock):
+    assert AdmissionQueue(rate=4, burst=1).wait_time(10) == 2.5
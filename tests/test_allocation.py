@@ -0,0 +1,76 @@
+"""
+Répartition des préférences (allocation.py) : comparaison avec une recherche
+exhaustive sur de petits cas, et règles de places et de périodes.
+"""
+
+
+import itertools
+import random
+
+from allocation import Preference, allocate
+from catalogue import Activity, Catalogue
+
+
+def brute_force(catalogue: Catalogue, preferences: list[Preference]) -> tuple[int, int]:
+    """
+        Meilleure affectation (une activité au plus par élève) : nombre d’élèves
+        servis maximal, puis somme des coûts (rang + 1)² minimale.
+    """
+
+    best = (0, 0)
+    options = [[None] + list(enumerate(preference.activities)) for preference in preferences]
+    for choice in itertools.product(*options):
+        taken = {}
+        for item in choice:
+            if item is not None:
+                taken[item[1].id] = taken.get(item[1].id, 0) + 1
+        if any(count > catalogue.by_id[activity_id].capacity for activity_id, count in taken.items()):
+            continue
+        served = sum(1 for item in choice if item is not None)
+        cost = sum((item[0] + 1) ** 2 for item in choice if item is not None)
+        if served > best[0] or (served == best[0] and cost < best[1]):
+            best = (served, cost)
+    return best
+
+
+def test_matches_brute_force():
+    rng = random.Random(0)
+    for _ in range(200):
+        activities = [Activity(f"D2/P9/A{i}", f"A{i}", "D2", 9, rng.randint(0, 2)) for i in range(3)]
+        catalogue = Catalogue(activities)
+        preferences = [Preference(f"e{i}@x.be", f"e{i}", 2, tuple(rng.sample(activities, rng.randint(1, 3))))
+                       for i in range(rng.randint(1, 5))]
+
+        result = allocate(catalogue, preferences)
+        cost = sum((rank + 1) ** 2 for assigned in result.assigned.values() for _, rank in assigned)
+        assert (len(result.assigned), cost) == brute_force(catalogue, preferences)
+
+        for activity in activities:
+            count = sum(1 for assigned in result.assigned.values() for chosen, _ in assigned if chosen == activity)
+            assert count <= activity.capacity
+
+
+def test_second_pass_and_registered_periods():
+    p9 = Activity("D2/P9/A", "A", "D2", 9, 5)
+    p10 = Activity("D2/P10/B", "B", "D2", 10, 5)
+    both = Activity("D2/P910/C", "C", "D2", 910, 5)
+    catalogue = Catalogue([p9, p10, both])
+    preferences = [Preference("a@x.be", "a", 2, (p9, both, p10)),
+                   Preference("b@x.be", "b", 2, (p9, p10))]
+
+    result = allocate(catalogue, preferences, registered={"b@x.be": [9]})
+
+    assert result.assigned["a@x.be"] == [(p9, 0), (p10, 2)]
+    assert result.assigned["b@x.be"] == [(p10, 1)]
+    assert result.unassigned == []
+
+
+def test_shared_places_count_existing_registrations():
+    shared = Activity("D2_D3/P9/A", "A", "D2_D3", 9, 2)
+    catalogue = Catalogue([shared])
+    preferences = [Preference("a@x.be", "a", 2, (shared,)), Preference("b@x.be", "b", 3, (shared,))]
+
+    result = allocate(catalogue, preferences, counts={("A", 9, 3): 1})
+
+    assert len(result.assigned) == 1
+    assert len(result.unassigned) == 1
@@ -0,0 +1,57 @@
+"""
+Fenêtre d’inscription (registration_window.py) : instants absolus autour du
+passage à l’heure d’hiver (25 octobre 2026, 3 h → 2 h en Belgique) et à minuit.
+"""
+
+
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from registration_window import load_window
+
+
+@pytest.fixture
+def window(tmp_path):
+    path = tmp_path / "registration_open.json"
+    path.write_text(json.dumps({"from": "24/10/2026", "from_hour": "17h30", "for": "26/10/2026"}), encoding="utf-8")
+    return load_window(str(path), "Europe/Brussels")
+
+
+def utc(*args) -> datetime:
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+def test_instants_use_the_local_offset(window):
+    # Heure d’été (UTC+2) à l’ouverture, heure d’hiver (UTC+1) à la fermeture
+    assert window.opens_at == utc(2026, 10, 24, 15, 30)
+    assert window.closes_at == utc(2026, 10, 25, 23, 0)
+    assert window.session == "2026-10-26"
+
+
+def test_is_open_across_the_dst_change(window):
+    assert not window.is_open(utc(2026, 10, 24, 15, 29, 59))
+    assert window.is_open(utc(2026, 10, 24, 15, 30))
+    # 2 h 30 locale, vécue deux fois cette nuit-là
+    assert window.is_open(utc(2026, 10, 25, 0, 30))
+    assert window.is_open(utc(2026, 10, 25, 1, 30))
+    # Minuit le jour du Focus Time, heure d’hiver
+    assert window.is_open(utc(2026, 10, 25, 22, 59, 59))
+    assert not window.is_open(utc(2026, 10, 25, 23, 0))
+
+
+def test_until_open_counts_the_extra_hour(tmp_path):
+    path = tmp_path / "registration_open.json"
+    path.write_text(json.dumps({"from": "25/10/2026", "from_hour": "08h00", "for": "27/10/2026"}), encoding="utf-8")
+    window = load_window(str(path), "Europe/Brussels")
+
+    # Veille 8 h (UTC+2) → lendemain 8 h (UTC+1) : 25 heures
+    assert window.until_open(utc(2026, 10, 24, 6, 0)) == timedelta(hours=25)
+    assert window.until_open(window.opens_at) is None
+
+
+def test_is_announced_uses_local_dates(window):
+    # 20/10 23 h 30 UTC = 21/10 1 h 30 à Bruxelles : trois jours avant l’ouverture
+    assert window.is_announced(utc(2026, 10, 20, 23, 30))
+    assert not window.is_announced(utc(2026, 10, 20, 21, 30))